@@ -1,64 +1,95 @@
 # golden/eval_golden.py
 import argparse, json, os, sys, requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# one pooled session for the whole run: keep-alive instead of a new TCP/TLS handshake per question
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.1))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 def citation_present(cites, gold):
-    import os
-    def norm(s): return (s or "").strip().lower()
-    def base(s): return os.path.basename(norm(s))
-    gold_names = { base(g.get("doc","")) for g in gold if g.get("doc") }
+    basename = os.path.basename
+    gold_names = tuple({ basename((g.get("doc") or "").strip().lower()) for g in gold if g.get("doc") })
     if not gold_names:
         return False
     for c in cites:
-        title = norm(c.get("title",""))
-        src   = norm(c.get("source_path",""))
-        if any(gn and (gn in title or gn in base(src) or gn in src) for gn in gold_names):
-            return True
+        title_norm = (c.get("title") or "").strip().lower()
+        src_norm   = (c.get("source_path") or "").strip().lower()
+        src_base   = basename(src_norm)
+        for gn in gold_names:
+            if gn and (gn in title_norm or gn in src_base or gn in src_norm):
+                return True
     return False
 
+def iter_jsonl(path, chunk_size=65536):
+    """Yield one parsed object per non-empty line, reading the file in bulk binary chunks."""
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read1(chunk_size)
+            if not buf:
+                break
+            lines = (tail + buf).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    tail = tail.strip()
+    if tail:
+        yield json.loads(tail)
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("gold_path", nargs="?", default=os.path.join(os.path.dirname(__file__), "golden_set.jsonl"))
     p.add_argument("--api", default=os.environ.get("RAG_API", "http://127.0.0.1:8000/chat"))
     p.add_argument("--k", type=int, default=int(os.environ.get("HIT_K", "5")))
+    p.add_argument("--workers", type=int, default=int(os.environ.get("EVAL_WORKERS", "8")),
+                   help="concurrent /chat requests (the server has its own concurrency)")
     p.add_argument("-v", "--verbose", action="store_true")
     args = p.parse_args()
 
     # sanity: ping health
     health_url = args.api.replace("/chat", "/health")
     try:
-        h = requests.get(health_url, timeout=5)
+        h = SESSION.get(health_url, timeout=5)
         h.raise_for_status()
         print(f"[ok] API health @ {health_url}: {h.json()}")
     except Exception as e:
         print(f"[err] Could not reach API health @ {health_url}\n{e}")
         return 2
 
+    def ask(q):
+        resp = SESSION.post(args.api, json={"user_msg": q["question"]}, timeout=20)
+        resp.raise_for_status()
+        return resp.json()
+
+    golden = list(iter_jsonl(args.gold_path))
     total = hit = hascite = 0
-    with open(args.gold_path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            q = json.loads(line)
-            question = q["question"]
-            resp = requests.post(args.api, json={"user_msg": question}, timeout=20)
-            resp.raise_for_status()
-            data = resp.json()
-            cites = data.get("citations", []) or []
+    # fan out the POSTs; map() yields in submission order so output stays deterministic
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        answers = list(pool.map(ask, golden))
 
-            if args.verbose:
-                print(f"\n[q] {question}")
-                if not cites:
-                    print("  [no citations]")
-                else:
-                    for i, c in enumerate(cites[:args.k], 1):
-                        print(f"  [{i}] title={c.get('title')!r} page={c.get('page')} src={c.get('source_path')!r}")
+    for q, data in zip(golden, answers):
+        question = q["question"]
+        cites = data.get("citations", []) or []
 
-            if citation_present(cites[:args.k], q.get("gold_sources", [])):
-                hit += 1
-            if cites:
-                hascite += 1
-            total += 1
+        if args.verbose:
+            print(f"\n[q] {question}")
+            if not cites:
+                print("  [no citations]")
+            else:
+                for i, c in enumerate(cites[:args.k], 1):
+                    print(f"  [{i}] title={c.get('title')!r} page={c.get('page')} src={c.get('source_path')!r}")
+
+        if citation_present(cites[:args.k], q.get("gold_sources", [])):
+            hit += 1
+        if cites:
+            hascite += 1
+        total += 1
 
     if total == 0:
         print("[warn] No questions found in golden set.")
@@ -69,4 +100,7 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
+    try:
+        sys.exit(main())
+    finally:
+        SESSION.close()
@@ -15,19 +15,57 @@
 # - Uses thread root as the canonical "question" and sends it as `last_q`
 # - Stable session_id per thread: f"{channel}_{thread_ts_or_ts}"
 
-import os, json, hmac, hashlib, time, re
+import os, json, hmac, time, re, base64
 import urllib.parse
-import requests
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+
+try:
+    # Optional: faster JSON (bytes in/bytes out); stdlib json is the fallback
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None  # type: ignore
+    _json_loads = json.loads
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
+_MAX_SKEW = 60 * 5  # replay window for Slack request timestamps (seconds)
+_HMAC_PROTO = hmac.new(SLACK_SIGNING_SECRET.encode("utf-8"), b"v0:", "sha256")  # pre-keyed; copied per request
 RAG_API_URL = os.environ["RAG_API_URL"]
 TIMEOUT_SECS = float(os.getenv("TIMEOUT_SECS", "10"))
 STRIP_BOT_MENTIONS = os.getenv("STRIP_BOT_MENTIONS", "true").lower() == "true"
 
-slack = WebClient(token=SLACK_BOT_TOKEN)
+# requests is imported on first use so url_verification never pays for it
+_HTTP = None   # pooled requests.Session for Slack, RAG API + response_url posts (keep-alive across warm invocations)
+SLACK_API = "https://slack.com/api"
+
+def _http():
+    global _HTTP
+    if _HTTP is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # only connect failures and 429/503 are retried: a POST that timed out mid-read may
+        # already have been processed, so read retries (read=0) would double-post
+        retry = Retry(total=2, connect=2, read=0, status=2, backoff_factor=0.2,
+                      status_forcelist=(429, 503), allowed_methods=frozenset({"GET", "POST"}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        _HTTP = requests.Session()
+        _HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return _HTTP
+
+def _slack_get(method: str, params: dict) -> dict:
+    r = _http().get(f"{SLACK_API}/{method}", params=params,
+                    headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}, timeout=3)
+    return _json_loads(r.content)
+
+def _slack_post(method: str, body: dict) -> dict:
+    r = _http().post(f"{SLACK_API}/{method}", data=_json_dumps(body),
+                     headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}",
+                              "Content-Type": "application/json; charset=utf-8"}, timeout=TIMEOUT_SECS)
+    return _json_loads(r.content)
 
 MENTION_RE = re.compile(r"<@([A-Z0-9]+)>")
 FOLLOWUP_RE = re.compile(
@@ -35,46 +73,74 @@ FOLLOWUP_RE = re.compile(
     re.I
 )
 
+# thread root text per (channel, thread_ts); roots rarely change, so a short TTL is enough
+_ROOT_CACHE: dict[tuple[str, str], tuple[str, float]] = {}
+_ROOT_TTL = 60
+
 def _ok(body: dict):
-    return {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": json.dumps(body)}
+    return {"statusCode": 200, "headers": {"Content-Type": "application/json"}, "body": _json_dumps(body).decode("utf-8")}
 
 def _text_ok(txt: str = "OK"):
     return {"statusCode": 200, "headers": {"Content-Type": "text/plain"}, "body": txt}
 
 def _bad_request(msg: str):
-    return {"statusCode": 400, "headers": {"Content-Type": "application/json"}, "body": json.dumps({"error": msg})}
+    return {"statusCode": 400, "headers": {"Content-Type": "application/json"}, "body": _json_dumps({"error": msg}).decode("utf-8")}
 
-def _verify_slack_signature(headers, body: str) -> bool:
+def _verify_slack_signature(headers, body: bytes) -> bool:
     """Verify Slack signing secret (required for Events + Slash)."""
     ts = headers.get("X-Slack-Request-Timestamp") or headers.get("x-slack-request-timestamp")
     sig = headers.get("X-Slack-Signature") or headers.get("x-slack-signature")
     if not ts or not sig:
         return False
-    # Reject old requests (+/− 5 minutes)
-    if abs(time.time() - float(ts)) > 60 * 5:
+    # Reject old/malformed timestamps (+/− 5 minutes) before hashing the body
+    try:
+        ts_i = int(ts)
+    except ValueError:
+        return False
+    now_i = int(time.time())
+    if not (now_i - _MAX_SKEW <= ts_i <= now_i + _MAX_SKEW):
+        return False
+    # compare raw 32-byte digests instead of hex strings; "v0=" + 64 hex chars, so check length first
+    if len(sig) != 67 or not sig.startswith("v0="):
+        return False
+    try:
+        sig_bytes = bytes.fromhex(sig[3:])
+    except ValueError:
         return False
-    basestring = f"v0:{ts}:{body}".encode("utf-8")
-    my_sig = "v0=" + hmac.new(SLACK_SIGNING_SECRET.encode("utf-8"), basestring, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(my_sig, sig)
+    h = _HMAC_PROTO.copy()
+    h.update(ts.encode("utf-8") + b":")
+    h.update(body)  # raw request bytes, exactly as Slack signed them
+    return hmac.compare_digest(h.digest(), sig_bytes)
 
 def normalize_slack_text(s: str) -> str:
     s = (s or "").strip()
     if STRIP_BOT_MENTIONS:
         s = MENTION_RE.sub("", s).strip()
-    # collapse whitespace
-    s = re.sub(r"\s+", " ", s)
-    return s
+    # collapse whitespace (C-level split/join, no regex pass)
+    return " ".join(s.split())
 
-def fetch_root_message_text(channel: str, root_ts: str) -> str:
+def fetch_root_message_text(channel: str, root_ts: str, ts: str | None = None, text: str = "") -> str:
     """Get the first/root message text for a thread (or the original message if not threaded)."""
+    # The current message *is* the root → we already have its text
+    if ts and ts == root_ts:
+        return text
+    key = (channel, root_ts)
+    hit = _ROOT_CACHE.get(key)
+    if hit is not None and hit[1] > time.time():
+        return hit[0]
     try:
-        # Slack returns the root as the first item when using conversations_replies with ts=root_ts
-        r = slack.conversations_replies(channel=channel, ts=root_ts, inclusive=True, limit=1)
+        # Slack returns the root as the first item when using conversations.replies with ts=root_ts
+        r = _slack_get("conversations.replies", {"channel": channel, "ts": root_ts, "inclusive": "true", "limit": 1})
+        if not r.get("ok"):
+            print(f"[slack] conversations.replies failed: {r.get('error')}")
+            return ""
         msgs = r.get("messages", [])
         if msgs:
-            return normalize_slack_text(msgs[0].get("text", ""))
-    except SlackApiError as e:
-        print(f"[slack] conversations_replies failed: {e.response['error']}")
+            root = normalize_slack_text(msgs[0].get("text", ""))
+            _ROOT_CACHE[key] = (root, time.time() + _ROOT_TTL)
+            return root
+    except Exception as e:
+        print(f"[slack] conversations.replies failed: {e}")
     return ""
 
 def rag_chat(user_msg: str, session_id: str, last_q: str | None, domain: str | None = None) -> dict:
@@ -89,11 +155,12 @@ def rag_chat(user_msg: str, session_id: str, last_q: str | None, domain: str | N
 
     print(f"[rag] POST {RAG_API_URL} session={session_id} user_msg='{user_msg[:80]}' last_q='{(last_q or '')[:80]}'")
     try:
-        resp = requests.post(RAG_API_URL, json=payload, timeout=TIMEOUT_SECS)
+        resp = _http().post(RAG_API_URL, data=_json_dumps(payload),
+                          headers={"Content-Type": "application/json"}, timeout=TIMEOUT_SECS)
         if resp.status_code != 200:
             print(f"[rag] non-200: {resp.status_code} {resp.text[:200]}")
             return {"answer": f"(stub) RAG error {resp.status_code}", "citations": []}
-        return resp.json()
+        return _json_loads(resp.content)
     except Exception as e:
         print(f"[rag] request failed: {e}")
         return {"answer": "(stub) RAG unavailable", "citations": []}
@@ -101,9 +168,11 @@ def rag_chat(user_msg: str, session_id: str, last_q: str | None, domain: str | N
 def respond_in_thread(channel: str, thread_ts: str, text: str):
     # Keep Slack message simple; your server already formats answer nicely if needed
     try:
-        slack.chat_postMessage(channel=channel, thread_ts=thread_ts, text=text or "…")
-    except SlackApiError as e:
-        print(f"[slack] chat_postMessage failed: {e.response['error']}")
+        r = _slack_post("chat.postMessage", {"channel": channel, "thread_ts": thread_ts, "text": text or "…"})
+        if not r.get("ok"):
+            print(f"[slack] chat.postMessage failed: {r.get('error')}")
+    except Exception as e:
+        print(f"[slack] chat.postMessage failed: {e}")
 
 def _handle_event_callback(event_body: dict):
     ev = event_body.get("event", {}) or {}
@@ -125,22 +194,34 @@ def _handle_event_callback(event_body: dict):
     session_id = f"{channel}_{thread_ts}"
 
     user_text = normalize_slack_text(ev.get("text", ""))
-    root_text = fetch_root_message_text(channel, thread_ts)  # canonical "last_q"
-
-    # If the current message looks like a follow-up ("more/expand/…") and we have a root, keep it short
-    if FOLLOWUP_RE.match(user_text) and root_text:
-        prompt = user_text  # server will stitch with prev['last_q']
-        last_q = root_text
-    else:
-        # First message or new topic → use user text as root, too, if not in a thread
-        last_q = root_text or user_text
-        prompt = user_text
+    prompt = user_text
+    last_q = user_text
+    # Only a threaded follow-up ("more/expand/…") needs the root; anything else skips the Slack lookup
+    if ev.get("thread_ts") and FOLLOWUP_RE.match(user_text):
+        root_text = fetch_root_message_text(channel, thread_ts, ts, user_text)  # canonical "last_q"
+        if root_text:
+            last_q = root_text  # server will stitch the short prompt with it
 
     out = rag_chat(prompt, session_id=session_id, last_q=last_q, domain=None)
     answer = out.get("answer") or "(no answer)"
     respond_in_thread(channel, thread_ts, answer)
     return _text_ok("ok")
 
+_SLASH_FIELDS = frozenset((b"text", b"response_url", b"channel_id", b"user_id", b"trigger_id"))
+
+def _parse_slash_form(raw: bytes, wanted=_SLASH_FIELDS) -> dict:
+    """Decode only the form fields the slash handler reads (straight from the body bytes); stop once all are found."""
+    out = {}
+    for pair in raw.split(b"&"):
+        k, sep, v = pair.partition(b"=")
+        if sep and k in wanted:
+            key = k.decode("ascii")
+            if key not in out:
+                out[key] = urllib.parse.unquote(v.replace(b"+", b" "))  # unquote_plus, bytes in -> str out
+                if len(out) == len(wanted):
+                    break
+    return out
+
 def _handle_slash_command(params: dict, headers: dict):
     # Slash commands arrive as application/x-www-form-urlencoded
     channel_id = params.get("channel_id")
@@ -155,7 +236,8 @@ def _handle_slash_command(params: dict, headers: dict):
     response_url = params.get("response_url")
     if response_url:
         try:
-            requests.post(response_url, json={"response_type": "in_channel", "text": out.get("answer", "(no answer)")}, timeout=5)
+            _http().post(response_url, data=_json_dumps({"response_type": "in_channel", "text": out.get("answer", "(no answer)")}),
+                       headers={"Content-Type": "application/json"}, timeout=5)
         except Exception as e:
             print(f"[slash] response_url post failed: {e}")
 
@@ -164,19 +246,21 @@ def _handle_slash_command(params: dict, headers: dict):
 def lambda_handler(event, context):
     # API Gateway v2 (HTTP API) typically places headers/body here:
     headers = event.get("headers") or {}
-    raw_body = event.get("body") or ""
-    if event.get("isBase64Encoded"):
-        # Slack sends plain text; but handle defensively
-        raw_body = urllib.parse.unquote_plus(raw_body)
+    body = event.get("body") or ""
+    # keep the body as bytes: signing and JSON parsing both work on them directly
+    raw_body = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("utf-8")
 
-    # 1) Slack URL verification (Events API)
-    try:
-        body = json.loads(raw_body)
-        if body.get("type") == "url_verification":
-            return _ok({"challenge": body.get("challenge", "")})
-    except Exception:
-        # Not JSON → maybe slash command or form-encoded event
-        pass
+    # 1) Slack URL verification (Events API) — only parse when the marker is present;
+    #    the parsed envelope is reused for event_callback below
+    parsed = None
+    if b'"url_verification"' in raw_body:
+        try:
+            parsed = _json_loads(raw_body)
+            if parsed.get("type") == "url_verification":
+                return _ok({"challenge": parsed.get("challenge", "")})
+        except Exception:
+            # Not JSON → maybe slash command or form-encoded event
+            parsed = None
 
     # Verify signature (if we can). For slash commands, body is form-encoded as a string.
     if not _verify_slack_signature(headers, raw_body):
@@ -186,17 +270,18 @@ def lambda_handler(event, context):
     # 2) Slash command (x-www-form-urlencoded)
     ctype = headers.get("Content-Type", headers.get("content-type", ""))
     if ctype.startswith("application/x-www-form-urlencoded"):
-        params = dict(urllib.parse.parse_qsl(raw_body))
+        params = _parse_slash_form(raw_body)
         return _handle_slash_command(params, headers)
 
-    # 3) Events API envelope
-    try:
-        body = json.loads(raw_body) if isinstance(raw_body, str) else raw_body
-    except Exception:
-        return _bad_request("bad json")
+    # 3) Events API envelope (parsed at most once per request)
+    if parsed is None:
+        try:
+            parsed = _json_loads(raw_body)
+        except Exception:
+            return _bad_request("bad json")
 
-    if body.get("type") == "event_callback":
-        return _handle_event_callback({"headers": headers, "event": body.get("event", {})})
+    if parsed.get("type") == "event_callback":
+        return _handle_event_callback({"headers": headers, "event": parsed.get("event", {})})
 
     # Fallback
     return _text_ok("ignored")
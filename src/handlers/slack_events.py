@@ -1,23 +1,59 @@
 # handlers/slack_events.py
-import os, hmac, hashlib, time, urllib.request
-import json
+import os, hmac, time
 from base64 import b64decode
-import boto3
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import re
+from functools import lru_cache
+
+from rag.core.jsonutil import dumps as _json_dumps, loads as _json_loads
 
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
-secrets = boto3.client("secretsmanager", region_name=AWS_REGION)
+# AWS Parameters and Secrets Lambda Extension (layer): sandbox-local secrets cache on localhost
+_SECRETS_EXT_PORT = os.environ.get("PARAMETERS_SECRETS_EXTENSION_HTTP_PORT", "2773")
+
+# boto3 / requests are imported on first use so the url_verification path stays cheap on cold start
+_secrets = None  # secretsmanager client (fallback when the extension layer isn't attached)
+_HTTP = None     # pooled requests.Session: warm containers reuse TCP/TLS to Slack + the RAG API
+
+def _sm():
+    global _secrets
+    if _secrets is None:
+        import boto3
+        _secrets = boto3.client("secretsmanager", region_name=AWS_REGION)
+    return _secrets
+
+def _http():
+    global _HTTP
+    if _HTTP is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # only connect failures and 429/503 are retried: a POST that timed out mid-read may
+        # already have been processed, so read retries (read=0) would double-post
+        retry = Retry(total=2, connect=2, read=0, status=2, backoff_factor=0.2,
+                      status_forcelist=(429, 503), allowed_methods=frozenset({"GET", "POST"}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        _HTTP = requests.Session()
+        _HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return _HTTP
 
 # --- simple in-memory caches (persist only on warm containers) ---
-_CACHE: Dict[str, str] = {}
+_CACHE: Dict[str, Tuple[str, float]] = {}  # arn_env -> (value, expires_at)
+_SECRET_TTL = int(os.getenv("SECRET_CACHE_TTL", "3600"))  # refresh hourly to pick up rotations
 _SEEN_EVENTS: Dict[str, float] = {}  # event_id -> expires_at (epoch secs)
 _DEDUPE_TTL = 600  # 10 minutes
-
-SLACK_BOT_TOKEN = None  # lazily fetched
+# shared across containers (Slack retries usually land on a different one); in-memory dedup is the fallback
+SLACK_DEDUPE_TABLE = os.getenv("SLACK_DEDUPE_TABLE", "").strip()
+_ddb = None  # dynamodb client, created lazily
+
+_lambda = None  # boto3 lambda client, created lazily for async dispatch
+_MAX_SKEW = 60 * 5  # replay window for Slack request timestamps (seconds)
+_HMAC_PROTO = None  # HMAC pre-keyed with the signing secret and fed b"v0:"; copied per request
+_SIGNING_SECRET_SRC: str | None = None  # secret value _HMAC_PROTO was built from
 _HEADING_RE   = re.compile(r'^\s*(#{1,6})\s+(.*)$', re.M)
 _CODEBLOCK_RE = re.compile(r'```.+?```', re.S)
 _INLINECODE_RE= re.compile(r'`([^`]+)`')
+_MENTION_RE   = re.compile(r'^\s*<@[^>]+>\s*')
 SLACK_BRIEF = os.getenv("SLACK_BRIEF", "1") == "1"
 SLACK_BRIEF_MAX_LINES = int(os.getenv("SLACK_BRIEF_MAX_LINES", "25"))
 SLACK_BRIEF_MAX_CHARS = int(os.getenv("SLACK_BRIEF_MAX_CHARS", "2500"))
@@ -40,19 +76,84 @@ def _already_seen(event_id: str) -> bool:
     _prune_seen()
     return event_id in _SEEN_EVENTS
 
+def _get_ddb():
+    global _ddb
+    if _ddb is None:
+        import boto3
+        _ddb = boto3.client("dynamodb", region_name=AWS_REGION)
+    return _ddb
+
+def _claim_event(event_id: str) -> bool:
+    """True the first time an event_id is seen (across containers when SLACK_DEDUPE_TABLE is set)."""
+    if SLACK_DEDUPE_TABLE:
+        try:
+            _get_ddb().put_item(
+                TableName=SLACK_DEDUPE_TABLE,
+                Item={"event_id": {"S": event_id}, "ttl": {"N": str(int(_now()) + _DEDUPE_TTL)}},
+                ConditionExpression="attribute_not_exists(event_id)",
+            )
+            return True
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return False
+            print("[slack] dedupe table unavailable; using in-memory dedup:", e)
+    if _already_seen(event_id):
+        return False
+    _mark_seen(event_id)
+    return True
+
+def _release_event(event_id: str):
+    """Undo _claim_event so Slack's retry of an event we failed to hand off is answered."""
+    _SEEN_EVENTS.pop(event_id, None)
+    if SLACK_DEDUPE_TABLE:
+        try:
+            _get_ddb().delete_item(TableName=SLACK_DEDUPE_TABLE, Key={"event_id": {"S": event_id}})
+        except Exception as e:
+            print("[slack] could not release dedupe claim:", e)
+
+def _secret_from_extension(arn: str):
+    """GetSecretValue-shaped dict from the extension's localhost cache, or None if it isn't available."""
+    token = os.environ.get("AWS_SESSION_TOKEN")
+    if not token:
+        return None  # not running in Lambda
+    from urllib.request import Request, urlopen
+    from urllib.parse import quote
+    req = Request(
+        f"http://localhost:{_SECRETS_EXT_PORT}/secretsmanager/get?secretId={quote(arn, safe='')}",
+        headers={"X-Aws-Parameters-Secrets-Token": token},
+    )
+    try:
+        with urlopen(req, timeout=0.5) as r:
+            return _json_loads(r.read())
+    except Exception as e:
+        print(f"[secrets] extension unavailable, using Secrets Manager: {e!r}")
+        return None
+
 def _get_secret_by_env(arn_env: str) -> str:
-    if arn_env in _CACHE:
-        return _CACHE[arn_env]
+    hit = _CACHE.get(arn_env)
+    if hit is not None and hit[1] > _now():
+        return hit[0]
     arn = os.environ.get(arn_env, "").strip()
     if not arn:
         raise RuntimeError(f"Missing env {arn_env}")
-    resp = secrets.get_secret_value(SecretId=arn)
+    resp = _secret_from_extension(arn)
+    if resp is None:
+        resp = _sm().get_secret_value(SecretId=arn)
     val = resp.get("SecretString")
     if val is None and "SecretBinary" in resp:
         val = b64decode(resp["SecretBinary"]).decode("utf-8")
-    _CACHE[arn_env] = val
+    _CACHE[arn_env] = (val, _now() + _SECRET_TTL)
     return val
 
+def _signing_mac():
+    """Pre-keyed HMAC-SHA256 for the signing secret; rebuilt only when the cached secret value changes."""
+    global _HMAC_PROTO, _SIGNING_SECRET_SRC
+    secret = _get_secret_by_env("SLACK_SIGNING_SECRET_ARN")
+    if _HMAC_PROTO is None or secret != _SIGNING_SECRET_SRC:
+        _HMAC_PROTO = hmac.new(secret.encode("utf-8"), b"v0:", "sha256")
+        _SIGNING_SECRET_SRC = secret
+    return _HMAC_PROTO
+
 def _verify(headers, body_bytes: bytes) -> bool:
     ts = headers.get("x-slack-request-timestamp") or headers.get("X-Slack-Request-Timestamp")
     sig = headers.get("x-slack-signature") or headers.get("X-Slack-Signature")
@@ -60,14 +161,25 @@ def _verify(headers, body_bytes: bytes) -> bool:
         return False
     # reject replays older than 5 minutes
     try:
-        if abs(_now() - int(ts)) > 60 * 5:
-            return False
+        ts_i = int(ts)
     except Exception:
         return False
-    signing_secret = _get_secret_by_env("SLACK_SIGNING_SECRET_ARN")
-    base = f"v0:{ts}:{body_bytes.decode()}".encode()
-    my_sig = "v0=" + hmac.new(signing_secret.encode(), base, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(my_sig, sig)
+    now_i = int(_now())
+    if not (now_i - _MAX_SKEW <= ts_i <= now_i + _MAX_SKEW):
+        return False
+    # compare raw 32-byte digests instead of hex strings; "v0=" + 64 hex chars, so check length first
+    if len(sig) != 67 or not sig.startswith("v0="):
+        return False
+    try:
+        sig_bytes = bytes.fromhex(sig[3:])
+    except ValueError:
+        return False
+    # only touch Secrets Manager once the request has passed the cheap header checks
+    # copy() skips re-deriving the key pads; the "v0:" prefix is already absorbed
+    h = _signing_mac().copy()
+    h.update(ts.encode("utf-8") + b":")
+    h.update(body_bytes)  # raw bytes, no decode/re-encode of the body
+    return hmac.compare_digest(h.digest(), sig_bytes)
 
 def _is_slack_retry(headers) -> bool:
     # Slack sets these on retries
@@ -79,9 +191,7 @@ def _is_slack_retry(headers) -> bool:
     )
 
 def _post_message(channel: str, text: str = None, blocks: List[Dict] = None, thread_ts: str = None):
-    global SLACK_BOT_TOKEN
-    if SLACK_BOT_TOKEN is None:
-        SLACK_BOT_TOKEN = _get_secret_by_env("SLACK_BOT_TOKEN_ARN")
+    token = _get_secret_by_env("SLACK_BOT_TOKEN_ARN")  # pre-warmed at init; TTL cache hit afterwards
 
     payload: Dict = {"channel": channel}
     if text is not None:
@@ -91,58 +201,41 @@ def _post_message(channel: str, text: str = None, blocks: List[Dict] = None, thr
     if thread_ts:
         payload["thread_ts"] = thread_ts
 
-    data = json.dumps(payload).encode()
-    req = urllib.request.Request(
+    r = _http().post(
         "https://slack.com/api/chat.postMessage",
-        data=data,
+        data=_json_dumps(payload),
         headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
+            "Content-Type": "application/json; charset=utf-8",
+            "Authorization": f"Bearer {token}",
             # keep requests crisp; Slack can be slow occasionally
         },
-        method="POST",
+        timeout=(2, 6),  # (connect, read)
     )
-    with urllib.request.urlopen(req, timeout=6) as r:
-        return json.loads(r.read().decode())
-
-def _promote_subheads(lines: list[str]) -> list[str]:
-    """Turn '## Something' into '*Something*' and keep as its own line."""
-    out = []
-    for ln in lines:
-        m = _HEADING_RE.match(ln)
-        if m:
-            hashes, text = m.group(1), m.group(2).strip()
-            if len(hashes) == 1:
-                # H1 handled in _smart_compact (as title)
-                continue
-            # H2+ become bold subsection lines
-            out.append(f"*{text}*")
-        else:
-            out.append(ln)
-    return out
+    r.raise_for_status()
+    return _json_loads(r.content)
 
 def _smart_compact_with_subheads(s: str) -> str:
     if not s:
         return ""
-    # strip code blocks/inline code
+    # strip code blocks, then inline code: one alternation would let a stray ` pair with a fence
     s = _CODEBLOCK_RE.sub("", s)
     s = _INLINECODE_RE.sub(r"\1", s)
 
-    # extract first H1 as title; leave other headings for promotion
+    # single pass over lines: drop blanks, first H1 becomes the title (other H1s dropped),
+    # H2+ become bold subsection lines
     title = None
     lines = []
     for raw in s.splitlines():
-        m = _HEADING_RE.match(raw)
-        if m and len(m.group(1)) == 1 and title is None:
-            title = m.group(2).strip()
+        if not raw.strip():
             continue
-        lines.append(raw.rstrip())
-
-    # collapse blanks
-    lines = [ln for ln in lines if ln.strip()]
-
-    # promote H2+ to bold lines
-    lines = _promote_subheads(lines)
+        m = _HEADING_RE.match(raw)
+        if m is None:
+            lines.append(raw.rstrip())
+        elif len(m.group(1)) == 1:
+            if title is None:
+                title = m.group(2).strip()
+        else:
+            lines.append(f"*{m.group(2).strip()}*")
 
     # compact only if long
     joined = "\n".join(lines)
@@ -156,27 +249,28 @@ def _smart_compact_with_subheads(s: str) -> str:
         body = f"*{title}*\n{body}"
     return body
 
+@lru_cache(maxsize=256)
 def _clean_text(s: str, max_len: int = 2500) -> str:
-    # collapse duplicate lines/paragraphs and clamp size to avoid Slack truncation
+    # collapse duplicate lines/paragraphs and clamp size to avoid Slack truncation;
+    # memoized because the same answer is cleaned for blocks and again for the text fallback
     if not s:
         return ""
-    lines = []
-    seen = set()
-    for raw in s.splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line in seen:
-            continue
-        seen.add(line)
-        lines.append(line)
-    out = "\n".join(lines)
+    # ordered dedup that stops once the joined text is past max_len (the rest would be clamped away)
+    seen: dict = {}
+    size = -1  # joined length so far ("\n" between lines)
+    for line in map(str.strip, s.splitlines()):
+        if line and line not in seen:
+            seen[line] = None
+            size += len(line) + 1
+            if size > max_len:
+                break
+    out = "\n".join(seen)
     if len(out) > max_len:
         out = out[:max_len].rstrip() + "…"
     return out
 
 def _as_blocks(answer: str, citations: list[dict]) -> list[dict]:
-    answer = _clean_text(answer, max_len=2500)
+    answer = _clean_text(answer)  # same cache key as the text fallback in _answer_in_thread
     if SLACK_BRIEF:
         answer = _smart_compact_with_subheads(answer)
 
@@ -198,44 +292,91 @@ def _call_rag_api(question: str) -> Dict:
     chat_api = os.environ.get("RagApiUrl", "").strip()
     if not chat_api:
         return {"answer": "RAG API URL not configured."}
-    body = json.dumps({"user_msg": question}).encode()
-    req = urllib.request.Request(
+    r = _http().post(
         chat_api,
-        data=body,
+        data=_json_dumps({"user_msg": question}),
         headers={"Content-Type": "application/json"},
-        method="POST"
+        timeout=(2, 8),
     )
-    with urllib.request.urlopen(req, timeout=8) as r:
-        return json.loads(r.read().decode())
+    r.raise_for_status()
+    return _json_loads(r.content)
+
+def _answer_in_thread(channel: str, question: str, thread_ts: str):
+    """Call RAG and post ONCE (runs in the async worker invocation)."""
+    try:
+        j = _call_rag_api(question)
+        ans = j.get("answer") or "No answer."
+        cits = j.get("citations") or []
+        blocks = _as_blocks(ans, cits)
+        try:
+            _post_message(channel, text="RAG result", blocks=blocks, thread_ts=thread_ts)
+        except Exception as e:
+            print("[slack] blocks post error; falling back to text:", e)
+            _post_message(channel, text=_clean_text(ans), thread_ts=thread_ts)
+    except Exception as e:
+        print("[rag] error calling RAG API:", e)
+        _post_message(channel, text="I couldn’t reach the RAG API right now.", thread_ts=thread_ts)
+
+def _get_lambda():
+    global _lambda
+    if _lambda is None:
+        import boto3
+        from botocore.config import Config
+        # keep-alive connection: each ACK path is one small Invoke call
+        _lambda = boto3.client("lambda", region_name=AWS_REGION,
+                               config=Config(tcp_keepalive=True, connect_timeout=2, read_timeout=5,
+                                             retries={"max_attempts": 2, "mode": "standard"}))
+    return _lambda
+
+def _dispatch_async(job: Dict):
+    """Hand the slow RAG + post work to SlackWorkerFunction (InvocationType=Event) so Slack gets its ACK < 3s."""
+    fn = os.environ.get("SLACK_WORKER_FUNCTION", "").strip()
+    if not fn:
+        # no self-invoke / inline fallback: this function's short timeout can't fit RAG + post
+        raise RuntimeError("SLACK_WORKER_FUNCTION is not set")
+    _get_lambda().invoke(FunctionName=fn, InvocationType="Event", Payload=_json_dumps({"slack_job": job}))
 
 def handler(event, context):
+    # Async worker invocation (from _dispatch_async) — not reachable through API Gateway
+    job = event.get("slack_job")
+    if job:
+        _answer_in_thread(job.get("channel"), job.get("question") or "", job.get("thread_ts"))
+        return {"statusCode": 200, "body": ""}
+
     headers = event.get("headers") or {}
+
+    # Without the shared dedupe table a retry can't be told apart from a handled event on another
+    # container: ACK it before any decode/verify/parse. With the table, retries go through the
+    # claim below, so a first attempt that died is still answered and duplicates are dropped.
+    if not SLACK_DEDUPE_TABLE and _is_slack_retry(headers):
+        return {"statusCode": 200, "body": ""}
+
     body = event.get("body") or ""
     body_bytes = b64decode(body) if event.get("isBase64Encoded") else body.encode()
 
-    # Slack URL verification (challenge)
-    try:
-        payload = json.loads(body_bytes.decode() or "{}")
-    except Exception:
-        payload = {}
-
-    if payload.get("type") == "url_verification":
-        return {"statusCode": 200, "headers": {"Content-Type": "text/plain"}, "body": payload.get("challenge", "")}
+    # Slack URL verification (challenge) — substring test first, full parse only for the handshake
+    if b'"url_verification"' in body_bytes:
+        try:
+            payload = _json_loads(body_bytes)
+        except Exception:
+            payload = {}
+        if payload.get("type") == "url_verification":
+            return {"statusCode": 200, "headers": {"Content-Type": "text/plain"}, "body": payload.get("challenge", "")}
 
     # Signature check
     if not _verify(headers, body_bytes):
         return {"statusCode": 401, "body": "bad signature"}
 
-    # Ignore Slack retries (we’ve likely already posted for this event)
-    if _is_slack_retry(headers):
-        return {"statusCode": 200, "body": ""}
+    # parse once, after the signature check (straight from bytes, no decode)
+    try:
+        payload = _json_loads(body_bytes or b"{}")
+    except Exception:
+        payload = {}
 
-    # De-dup by event_id
+    # De-dup by event_id (first deliveries and, with SLACK_DEDUPE_TABLE, Slack retries)
     event_id = payload.get("event_id")
-    if event_id:
-        if _already_seen(event_id):
-            return {"statusCode": 200, "body": ""}
-        _mark_seen(event_id)
+    if event_id and not _claim_event(event_id):
+        return {"statusCode": 200, "body": ""}  # already handled (Slack retry)
 
     # Handle events
     if payload.get("type") == "event_callback":
@@ -247,8 +388,7 @@ def handler(event, context):
 
             # strip the @mention prefix to form the question
             # Slack usually formats as "<@UXXXXXX> rest of text"
-            parts = text.split(">", 1)
-            question = parts[1].strip() if len(parts) > 1 else text
+            question = _MENTION_RE.sub("", text, count=1).strip()
 
             # Quick ping shortcut
             if question.lower() == "ping":
@@ -258,24 +398,34 @@ def handler(event, context):
                     print("[slack] postMessage error:", e)
                 return {"statusCode": 200, "body": ""}
 
-            # Call RAG and post ONCE
+            # ACK now; the worker invocation calls RAG and posts
+            job = {"channel": channel, "question": question, "thread_ts": thread_ts}
             try:
-                j = _call_rag_api(question)
-                ans = j.get("answer") or "No answer."
-                cits = j.get("citations") or []
-                blocks = _as_blocks(ans, cits)
-                try:
-                    _post_message(channel, text="RAG result", blocks=blocks, thread_ts=thread_ts)
-                except Exception as e:
-                    print("[slack] blocks post error; falling back to text:", e)
-                    _post_message(channel, text=_clean_text(ans), thread_ts=thread_ts)
+                _dispatch_async(job)
             except Exception as e:
-                print("[rag] error calling RAG API:", e)
-                _post_message(channel, text="I couldn’t reach the RAG API right now.", thread_ts=thread_ts)
+                print("[slack] async dispatch failed:", repr(e))
+                if event_id:
+                    _release_event(event_id)
+                return {"statusCode": 500, "body": "dispatch failed"}  # Slack retries the event
 
         # Always ACK
         return {"statusCode": 200, "body": ""}
 
     # Default ACK
     return {"statusCode": 200, "body": ""}
-    
\ No newline at end of file
+
+def _prewarm_secrets():
+    """Fetch both Slack secrets during Lambda init so the first event doesn't pay for them."""
+    if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("SLACK_PREWARM_SECRETS", "1") != "1":
+        return  # local runs / tests: stay lazy
+    for arn_env in ("SLACK_SIGNING_SECRET_ARN", "SLACK_BOT_TOKEN_ARN"):
+        try:
+            _get_secret_by_env(arn_env)
+        except Exception as e:
+            print(f"[init] secret prewarm failed for {arn_env}: {e!r}")
+    try:
+        _signing_mac()
+    except Exception as e:
+        print(f"[init] signing key prewarm failed: {e!r}")
+
+_prewarm_secrets()
@@ -0,0 +1,52 @@
+# src/rag/adapters/_embed_cache.py
+"""
+Process-wide LRU of embeddings shared by the embedder adapters. Embeddings are deterministic,
+so entries are keyed by sha256(prefix|text) where prefix pins the model (and input type).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class EmbedCache:
+    """Thread-safe LRU; callers run on several threads (dev server, batcher, overlapped embed futures)."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._d: "OrderedDict[bytes, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def clear(self):
+        with self._lock:
+            self._d.clear()
+
+    def get_or_compute(self, prefix: str, texts: list, compute, store=None) -> list:
+        """
+        Vectors for texts in input order. Misses are computed with one compute(list_of_texts) call
+        (duplicates within the call once); store(v), if given, is what the cache keeps for a fresh v.
+        """
+        if self.max_items <= 0:
+            return list(compute(texts))
+        keys = [hashlib.sha256(f"{prefix}\n{t}".encode("utf-8")).digest() for t in texts]
+        rows: dict = {}  # this call's snapshot: each cached entry is read once, under the lock
+        miss: dict = {}
+        with self._lock:
+            for k, t in zip(keys, texts):
+                v = self._d.get(k)
+                if v is None:
+                    miss.setdefault(k, t)
+                else:
+                    self._d.move_to_end(k)
+                    rows[k] = v
+        if miss:
+            fresh = dict(zip(miss, compute(list(miss.values()))))
+            rows.update(fresh)
+            with self._lock:
+                for k, v in fresh.items():
+                    self._d[k] = store(v) if store else v
+                while len(self._d) > self.max_items:
+                    self._d.popitem(last=False)
+        return [rows[k] for k in keys]
@@ -0,0 +1,72 @@
+# src/rag/adapters/_simd_kernels.py
+"""
+Optional Numba kernels for NumpyStore. When numba isn't installed, top_k_cosine is None
+and callers fall back to the NumPy / SimSIMD path.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+_BLOCK = 4096  # rows per parallel task; each task keeps its own top-k
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _block_top_k(X, q, k, block, min_score):
+        n, d = X.shape
+        h = d // 4  # rows are checked for an early reject after the first quarter of dims
+        q_tail = np.float32(0.0)
+        for j in range(h, d):
+            q_tail += q[j] * q[j]
+        q_tail = np.sqrt(q_tail)
+        nblocks = (n + block - 1) // block
+        cand_idx = np.full((nblocks, k), -1, dtype=np.int64)
+        cand_val = np.full((nblocks, k), -np.inf, dtype=np.float32)
+        for b in prange(nblocks):
+            lo = b * block
+            hi = min(lo + block, n)
+            vals = cand_val[b]
+            idxs = cand_idx[b]
+            for i in range(lo, hi):
+                thr = max(vals[k - 1], min_score)
+                s = np.float32(0.0)
+                xn = np.float32(0.0)
+                for j in range(h):
+                    s += X[i, j] * q[j]
+                    xn += X[i, j] * X[i, j]
+                # unit rows: |tail dot| <= ||x_tail|| * ||q_tail|| <= sqrt(1 - ||x_head||^2) * ||q_tail||
+                if s + np.sqrt(max(np.float32(0.0), np.float32(1.0) - xn)) * q_tail < thr:
+                    continue
+                for j in range(h, d):
+                    s += X[i, j] * q[j]
+                # vals is kept sorted descending; insert only if it beats the current k-th
+                if s > vals[k - 1] and s >= min_score:
+                    p = k - 1
+                    while p > 0 and vals[p - 1] < s:
+                        vals[p] = vals[p - 1]
+                        idxs[p] = idxs[p - 1]
+                        p -= 1
+                    vals[p] = s
+                    idxs[p] = i
+        return cand_idx, cand_val
+
+    def top_k_cosine(X: np.ndarray, q: np.ndarray, k: int, min_score: float = -np.inf):
+        """
+        Fused dot + top-k over unit rows X [N, D] for a unit query q [D], one pass over X.
+        Rows that provably can't reach the current k-th score (or min_score) are dropped
+        after a quarter of their dims. Returns (idx, score) sorted by descending score.
+        """
+        k = min(k, X.shape[0])
+        cand_idx, cand_val = _block_top_k(X, q, k, _BLOCK, np.float32(min_score))
+        idx, val = cand_idx.ravel(), cand_val.ravel()
+        keep = idx >= 0
+        idx, val = idx[keep], val[keep]
+        order = np.argsort(-val, kind="stable")[:k]
+        return idx[order], val[order]
+
+else:
+    top_k_cosine = None
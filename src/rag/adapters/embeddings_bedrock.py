@@ -1,19 +1,42 @@
 # src/rag/adapters/embeddings_bedrock.py
-import os, time
-import json
+import os
+import numpy as np
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+from rag.adapters._embed_cache import EmbedCache
+from rag.core.jsonutil import dumps as _json_dumps, loads as _json_loads
+
+# Cohere v3 on Bedrock accepts at most 96 texts per request
+COHERE_MAX_BATCH = int(os.getenv("COHERE_BATCH", "96"))
+
+# process-wide LRU of embeddings, keyed by sha256(model|input_type|text)
+_EMBED_CACHE = EmbedCache(int(os.getenv("EMBED_CACHE_SIZE", "4096")))
 
 class BedrockEmbedder:
     """
     Supports Titan (amazon.titan-embed-text-v2:0) and Cohere (cohere.embed-english-v3 / cohere.embed-multilingual-v3).
-    - Titan v2: one text per call -> we loop.
-    - Cohere v3: accepts batch -> one call per batch.
+    - Titan v2: one text per call -> calls fan out over a small thread pool.
+    - Cohere v3: accepts batch -> texts split into COHERE_MAX_BATCH chunks, chunks fan out the same way.
     """
-    def __init__(self, model_id: str = None, region: str = None, dim: int | None = None):
+    def __init__(self, model_id: str = None, region: str = None, dim: int | None = None,
+                 input_type: str = "search_document"):
         self.model_id = model_id or os.getenv("BEDROCK_EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
         self.region = region or os.getenv("AWS_REGION", "us-east-1")
-        self.client = boto3.client("bedrock-runtime", region_name=self.region)
+        self.concurrency = max(1, int(os.getenv("BEDROCK_EMBED_CONCURRENCY", "8")))
+        # adaptive retries absorb throttling; keep-alive pool sized for the fan-out
+        self.client = boto3.client(
+            "bedrock-runtime",
+            region_name=self.region,
+            config=Config(
+                retries={"max_attempts": 5, "mode": "adaptive"},
+                tcp_keepalive=True,
+                max_pool_connections=max(10, self.concurrency),
+            ),
+        )
         self.dim = dim  # optional; not required
+        self.input_type = input_type  # Cohere only: "search_document" or "search_query"
 
     def _invoke(self, body: dict):
         #print(f"[bedrock] invoking model: {self.model_id}")
@@ -21,36 +44,48 @@ class BedrockEmbedder:
             modelId=self.model_id,
             contentType="application/json",
             accept="application/json",
-            body=json.dumps(body)
+            body=_json_dumps(body)
         )
-        return json.loads(resp["body"].read().decode("utf-8"))
+        # ~1k floats per vector: parsed straight from the response bytes
+        return _json_loads(resp["body"].read())
 
     def _is_cohere(self):
         return self.model_id.startswith("cohere.")
 
+    def _map(self, fn, items: list) -> list:
+        # run fn over items on a thread pool, results kept in input order
+        if len(items) == 1 or self.concurrency == 1:
+            return [fn(x) for x in items]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as pool:
+            return list(pool.map(fn, items))
+
     def embed(self, texts: list[str]) -> list[list[float]]:
         if not texts:
             return []
+        return _EMBED_CACHE.get_or_compute(f"{self.model_id}\n{self.input_type}", texts, self._embed_uncached)
+
+    def embed_np(self, texts: list[str]) -> np.ndarray:
+        """[N, D] float32 (same vectors as embed()), for callers that work on arrays."""
+        vecs = self.embed(texts)
+        if not vecs:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(vecs, dtype=np.float32)
 
+    def _embed_uncached(self, texts: list[str]) -> list[list[float]]:
         if self._is_cohere():
-            # Cohere v3: batch API
-            body = {
-                "texts": texts,
-                "input_type": "search_document"  # reasonable default
-            }
-            #print(f"[bedrock] invoking model: {self.model_id}")
-            out = self._invoke(body)
-            # response: {"id":"...", "embeddings":[{"embedding":[...]} , ...]}
-            return [e["embedding"] for e in out.get("embeddings", [])]
+            # Cohere v3: batch API, capped at COHERE_MAX_BATCH texts per call
+            def _batch(chunk: list[str]) -> list[list[float]]:
+                out = self._invoke({"texts": chunk, "input_type": self.input_type})
+                # response: {"id":"...", "embeddings":[{"embedding":[...]} , ...]}
+                return [e["embedding"] for e in out.get("embeddings", [])]
+
+            chunks = [texts[i:i + COHERE_MAX_BATCH] for i in range(0, len(texts), COHERE_MAX_BATCH)]
+            return [v for vecs in self._map(_batch, chunks) for v in vecs]
 
         else:
-            # Titan v2: one text per call -> loop
-            vecs: list[list[float]] = []
-            for t in texts:
-                body = {"inputText": t}
-                out = self._invoke(body)
+            # Titan v2: one text per call -> concurrent calls
+            def _one(t: str) -> list[float]:
                 # response: {"embedding":[...]}
-                vecs.append(out["embedding"])
-                # tiny sleep to be gentle with rate limits
-                time.sleep(0.01)
-            return vecs
+                return self._invoke({"inputText": t})["embedding"]
+
+            return self._map(_one, texts)
@@ -1,15 +1,42 @@
+import os
 from typing import List
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from rag.adapters._embed_cache import EmbedCache
+
+# process-wide LRU of float32 rows, keyed by sha256(model|text); same knob as the Bedrock embedder
+_EMBED_CACHE = EmbedCache(int(os.getenv("EMBED_CACHE_SIZE", "4096")))
 
 class LocalEmbedder:
     def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+        try:
+            import torch
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        except Exception:
+            self.device = "cpu"
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=self.device)
+        if self.device == "cuda":
+            self.model.half()  # fp16 on GPU; CPU stays fp32
+        self.batch_size = int(os.getenv("EMBED_BS", "64"))
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
+    def embed_np(self, texts: List[str]) -> np.ndarray:
+        """[N, D] float32, L2-normalized; no per-float Python objects."""
         if isinstance(texts, str):
             texts = [texts]
-        vecs = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
-        return vecs.tolist()
+        if not texts:
+            return self._encode(texts)
+        # the cache keeps its own copy of each row (not a view pinning the whole batch); np.stack
+        # copies again on the way out, since callers may normalize their rows in place
+        return np.stack(_EMBED_CACHE.get_or_compute(self.model_name, texts, self._encode, store=np.copy))
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vecs = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False)
+        return vecs.astype(np.float32, copy=False)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_np(texts).tolist()
 
 # from sentence_transformers import SentenceTransformer
 # import numpy as np
@@ -1,5 +1,104 @@
 # src/rag/adapters/vs_numpy.py
-import os, json, boto3, numpy as np
+import os, numpy as np
+from operator import itemgetter
+from rag.core.jsonutil import json_line as _json_line, loads as _json_loads
+
+from rag.adapters._simd_kernels import top_k_cosine  # None unless numba is installed
+
+try:
+    # Optional: HNSW graph for approximate search on large indexes (VECTOR_ANN=hnsw)
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    # Optional: FAISS IVF-PQ for approximate search on large indexes (VECTOR_ANN=ivfpq)
+    import faiss
+except ImportError:
+    faiss = None
+
+_FUSED_MIN_ROWS = int(os.getenv("VECTOR_FUSED_MIN_ROWS", "10000"))  # below this, GEMV + argpartition wins
+_QUERY_BLOCK = int(os.getenv("VECTOR_QUERY_BLOCK", "16"))  # queries per GEMM; bounds the [B, N] score buffer
+_ANN_MIN_ROWS = int(os.getenv("VECTOR_ANN_MIN_ROWS", "10000"))  # brute force is cheaper below this
+_L2_BYTES = int(os.getenv("VECTOR_L2_BYTES", str(1 << 20)))  # per-core L2; row tiles target half of it
+_ROW_TILE = int(os.getenv("VECTOR_ROW_TILE", "0"))  # 0 = derive from _L2_BYTES and the index dim
+_META_MMAP = os.getenv("VECTOR_META_MMAP", "0") == "1"  # chunk text read from meta.jsonl per hit, not held in RAM
+
+try:
+    # Optional: SIMD distance kernels (AVX-512 / NEON / SVE picked at runtime); NumPy BLAS is the fallback
+    import simsimd as _simsimd
+except ImportError:
+    _simsimd = None
+
+
+class _MmapTexts:
+    """chunk_text column backed by a read-only mmap of meta.jsonl; row i is parsed from line i on access."""
+
+    def __init__(self, path: str):
+        import mmap
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        nl = np.flatnonzero(np.frombuffer(self._mm, dtype=np.uint8) == 0x0A)
+        starts = np.concatenate(([0], nl + 1)).tolist()
+        ends = np.concatenate((nl, [len(self._mm)])).tolist()
+        if starts[-1] == len(self._mm):  # file ends in "\n": no trailing partial line
+            starts.pop(); ends.pop()
+        self._starts, self._ends = starts, ends
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __getitem__(self, i: int) -> str:
+        line = self._mm[self._starts[i]:self._ends[i]].strip()
+        try:
+            m = _json_loads(line) if line else {}
+        except Exception:
+            m = {}
+        return m.get("chunk_text") or m.get("text") or ""
+
+
+def _sq_norms(X: np.ndarray) -> np.ndarray:
+    """Row-wise squared L2 norms in one pass (no [N, D] temporary, no sqrt)."""
+    return np.einsum("ij,ij->i", X, X)
+
+def _aligned_empty(shape, dtype, align: int = 64) -> np.ndarray:
+    """Uninitialized C-contiguous array whose data pointer is `align`-byte aligned (AVX-512 loads)."""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    off = (-raw.ctypes.data) % align
+    return raw[off:off + nbytes].view(dtype).reshape(shape)
+
+def _aligned_copy(a, dtype=np.float32) -> np.ndarray:
+    out = _aligned_empty(np.shape(a), dtype)
+    np.copyto(out, a, casting="unsafe")
+    return out
+
+
+class _IVFPQ:
+    """
+    FAISS IVF-PQ over unit rows behind the hnswlib knn_query() interface: probes a few
+    Voronoi cells, then re-scores the PQ candidates exactly against the float32 rows.
+    """
+
+    def __init__(self, index, vecs: np.ndarray, rerank: int):
+        self.index = index
+        self.vecs = vecs
+        self.rerank = max(1, rerank)
+
+    def knn_query(self, Q: np.ndarray, k: int):
+        kc = min(k * self.rerank, self.vecs.shape[0])
+        _, cand = self.index.search(Q, kc)  # [B, kc], -1 where the probed cells ran out
+        labels = np.full((Q.shape[0], k), -1, dtype=np.int64)
+        dists = np.ones((Q.shape[0], k), dtype=np.float32)
+        for b in range(Q.shape[0]):
+            c = cand[b][cand[b] >= 0]
+            exact = np.asarray(self.vecs[np.sort(c)], dtype=np.float32) @ Q[b]
+            order = np.argsort(-exact)[:k]
+            labels[b, :order.size] = np.sort(c)[order]
+            dists[b, :order.size] = 1.0 - exact[order]
+        return labels, dists
+
 
 class NumpyStore:
     """
@@ -7,14 +106,30 @@ class NumpyStore:
     Expects:
       - vectors: npy file of shape [N, D], dtype float32 (or convertible)
       - meta:    jsonl file with N lines (one dict per vector)
+    Meta is held column-wise (one list per field the search path reads) rather than
+    as N dicts, which keeps per-vector overhead to a few list slots.
     """
 
     def __init__(self, index_path: str, meta_path: str):
         self.index_path = index_path
         self.meta_path  = meta_path
         self.vecs: np.ndarray | None = None   # [N, D]
-        self.meta: list[dict] = []
+        # meta columns, row i <-> vecs[i]
+        self._texts:   list[str] = []
+        self._titles:  list = []
+        self._sources: list = []
+        self._pages:   list = []
         self.dim:  int | None = None
+        # VECTOR_QUANT=int8 keeps rows as int8 + a per-row scale (4x less RAM than float32);
+        # VECTOR_QUANT=fp16 keeps half-precision rows (2x less, no scale needed)
+        self.quant = os.getenv("VECTOR_QUANT", "").strip().lower()
+        self._scale: np.ndarray | None = None   # [N] float32, only set when quantized
+        # int8/fp16: re-score the top k*VECTOR_RERANK approximate hits against the float32 rows
+        self.rerank = max(0, int(os.getenv("VECTOR_RERANK", "4")))
+        self._fp32: np.ndarray | None = None    # read-only mmap of vectors.npy for that re-score
+        self._prefetch = None  # (bucket, prefix, Future) from prefetch()
+        self.ann = os.getenv("VECTOR_ANN", "").strip().lower()
+        self._ann = None  # hnswlib.Index / _IVFPQ over the float32 rows, when enabled
         self._ready = False
 
     def begin_build(self):
@@ -25,28 +140,72 @@ class NumpyStore:
 
     def add_batch(self, vecs, metas):
         """Append a batch of vectors + meta dicts (same length)."""
-        import numpy as np
         assert len(vecs) == len(metas), "vecs/metas length mismatch"
         # ensure float32 + L2-normalize
-        vecs = np.asarray(vecs, dtype=np.float32)
-        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        vecs = vecs / norms
+        vecs = _aligned_copy(vecs)  # own (64B-aligned) copy; normalized in place below
+        self._normalize_rows(vecs)
         self._b_vecs.append(vecs)
         self._b_meta.extend(metas)
 
     def finalize(self):
         """Write vectors.npy + meta.jsonl to index_path/meta_path and load them."""
-        import numpy as np, json, os
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-        V = np.vstack(self._b_vecs) if self._b_vecs else np.zeros((0, 1), dtype=np.float32)
-        np.save(self.index_path, V)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            for m in self._b_meta:
-                f.write(json.dumps(m, ensure_ascii=False) + "\n")
-        # load into runtime arrays
+        if self._b_vecs:
+            # stream batches into a preallocated .npy instead of vstack-ing a second full copy in RAM
+            from numpy.lib.format import open_memmap
+            n = sum(b.shape[0] for b in self._b_vecs)
+            # write beside the target and rename: a live mmap of the old index stays valid
+            tmp_path = self.index_path + ".tmp.npy"
+            out = open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                              shape=(n, self._b_vecs[0].shape[1]))
+            row = 0
+            for b in self._b_vecs:
+                out[row:row + b.shape[0]] = b
+                row += b.shape[0]
+            out.flush()
+            del out
+            os.replace(tmp_path, self.index_path)
+            V = np.load(self.index_path, mmap_mode="r")  # served from page cache, like _load_local
+        else:
+            V = np.zeros((0, 1), dtype=np.float32)
+            np.save(self.index_path, V)
+        # one large buffered writelines instead of a write() call per record
+        with open(self.meta_path, "wb", buffering=1 << 16) as f:
+            f.writelines(_json_line(m) for m in self._b_meta)
+        # rows were normalized in add_batch; install them directly instead of re-reading the files
+        metas = self._b_meta
         self._b_vecs, self._b_meta = [], []
-        self._load_local(self.index_path, self.meta_path)  # reuses your existing loader
+        self._install(V, metas, fp32_path=self.index_path)
+
+    @staticmethod
+    def _readahead(vecs):
+        """Ask the kernel to page the whole mapping in asynchronously (one hint, no blocking reads)."""
+        mm = getattr(vecs, "_mmap", None)
+        if mm is None or not hasattr(mm, "madvise"):
+            return
+        try:
+            import mmap
+            mm.madvise(mmap.MADV_WILLNEED)
+        except Exception:
+            pass  # advisory only (e.g. not supported on this platform)
+
+    @staticmethod
+    def _rows_are_unit(n2: np.ndarray) -> bool:
+        """n2: squared row norms (_sq_norms). ||x||^2 within ~2e-4 of 1  <=>  ||x|| within ~1e-4 of 1."""
+        return bool(n2.size) and bool(np.all((np.abs(n2 - 1.0) <= 2e-4) | (n2 == 0)))
+
+    @classmethod
+    def _normalize_rows(cls, vecs: np.ndarray, n2: np.ndarray | None = None) -> np.ndarray:
+        """L2-normalize rows in place (safe for zero rows); no-op when rows are already unit length.
+        n2: the rows' squared norms when the caller already has them."""
+        if n2 is None:
+            n2 = _sq_norms(vecs)
+        if cls._rows_are_unit(n2):
+            return vecs  # ingest writes normalized vectors; skip the O(N*D) rewrite
+        n2[n2 == 0] = 1.0
+        # one reciprocal sqrt per row, then a single in-place scaling pass
+        np.multiply(vecs, (1.0 / np.sqrt(n2))[:, None], out=vecs)
+        return vecs
 
     def _load_local(self, idx_path: str, meta_path: str):
         if not os.path.isfile(idx_path):
@@ -54,59 +213,229 @@ class NumpyStore:
         if not os.path.isfile(meta_path):
             raise FileNotFoundError(f"meta jsonl not found: {meta_path}")
 
+        # ingest/finalize write float32 unit rows: serve those straight from the mmap (page cache,
+        # no heap copy); anything else is copied once and normalized in place
         vecs = np.load(idx_path, mmap_mode="r")
-        if vecs.dtype != np.float32:
-            vecs = vecs.astype(np.float32, copy=False)
-
-        # L2 normalize rows (safe)
-        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        vecs = vecs / norms
-
-        meta = []
-        with open(meta_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    meta.append({})
-                    continue
-                try:
-                    meta.append(json.loads(line))
-                except Exception:
-                    meta.append({})
+        self._readahead(vecs)
+        # squared norms computed once: they decide unit-ness and, if not, drive the normalization
+        n2 = _sq_norms(vecs) if (vecs.dtype == np.float32 and vecs.flags.c_contiguous) else None
+        if n2 is None or not self._rows_are_unit(n2):
+            vecs = _aligned_copy(vecs)  # mmap data is already 64B-aligned (npy header); copies are made so too
+            self._normalize_rows(vecs, n2)  # n2 is exact for the float32 copy of float32 rows
+
+        def _metas():
+            # bytes lines straight into the parser: no per-line UTF-8 decode into str
+            with open(meta_path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    try:
+                        yield _json_loads(line) if line else {}
+                    except Exception:
+                        yield {}
+
+        # VECTOR_META_MMAP=1: only the short columns stay on the heap; hit texts come from the page cache
+        texts = _MmapTexts(meta_path) if _META_MMAP and os.path.getsize(meta_path) else None
+        self._install(vecs, _metas(), fp32_path=idx_path, texts=texts)
 
-        if vecs.shape[0] != len(meta):
-            raise ValueError(f"count mismatch: vectors={vecs.shape[0]} meta_lines={len(meta)}")
+    def _install(self, vecs: np.ndarray, metas, fp32_path: str | None = None, texts=None):
+        """Make (normalized) vecs + their meta dicts the live index (texts: optional prebuilt text column)."""
+        scale, fp32 = None, None
+        if self.quant in ("int8", "fp16"):
+            if self.quant == "int8":
+                vecs, scale = self._quantize_int8(vecs)
+            else:
+                vecs = _aligned_copy(vecs, dtype=np.float16)
+            if self.rerank and fp32_path:
+                fp32 = np.load(fp32_path, mmap_mode="r")  # page cache, not heap
+
+        # every chunk of a document repeats its title/source: keep one shared str per distinct value
+        shared: dict = {}
+        keep_texts = texts is None
+        if keep_texts:
+            texts = []
+        titles, sources, pages = [], [], []
+        for m in metas:
+            if keep_texts:
+                texts.append(m.get("chunk_text") or m.get("text") or "")
+            t = m.get("title")
+            titles.append(shared.setdefault(t, t) if isinstance(t, str) else t)
+            src = m.get("source_path") or m.get("source") or m.get("url")
+            sources.append(shared.setdefault(src, src) if isinstance(src, str) else src)
+            pages.append(m.get("page"))
+
+        if vecs.shape[0] != len(titles):
+            raise ValueError(f"count mismatch: vectors={vecs.shape[0]} meta_lines={len(titles)}")
 
         self.vecs = vecs
-        self.meta = meta
+        self._scale = scale
+        self._fp32 = fp32
+        self._ann = self._build_ann(vecs, fp32_path) if vecs.dtype == np.float32 else None
+        self._texts, self._titles, self._sources, self._pages = texts, titles, sources, pages
         self.dim  = int(vecs.shape[1])
         self._ready = True
-        print(f"[vectors] loaded local index: N={vecs.shape[0]} D={self.dim}")
+        print(f"[vectors] loaded local index: N={vecs.shape[0]} D={self.dim} dtype={vecs.dtype}")
+
+    def _build_ann(self, vecs: np.ndarray, path: str | None):
+        """HNSW (inner product on unit rows) for large float32 indexes; reuses a saved graph if present."""
+        n = vecs.shape[0]
+        if self.ann == "ivfpq":
+            return self._build_ivfpq(vecs, path)
+        if self.ann != "hnsw" or hnswlib is None or n <= _ANN_MIN_ROWS:
+            return None
+        ann = hnswlib.Index(space="ip", dim=int(vecs.shape[1]))
+        side = f"{path}.hnsw" if path else None
+        try:
+            if side and os.path.isfile(side) and os.path.getmtime(side) >= os.path.getmtime(path):
+                ann.load_index(side, max_elements=n)
+                if ann.get_current_count() == n:
+                    ann.set_ef(int(os.getenv("VECTOR_ANN_EF", "64")))
+                    return ann
+                ann = hnswlib.Index(space="ip", dim=int(vecs.shape[1]))
+        except Exception as e:
+            print(f"[vectors] stale/unreadable HNSW graph, rebuilding: {e}")
+            ann = hnswlib.Index(space="ip", dim=int(vecs.shape[1]))
+        ann.init_index(max_elements=n, M=16, ef_construction=200)
+        ann.add_items(vecs, np.arange(n))
+        ann.set_ef(int(os.getenv("VECTOR_ANN_EF", "64")))
+        if side:
+            try:
+                ann.save_index(side)
+            except Exception as e:
+                print(f"[vectors] could not save HNSW graph: {e}")
+        print(f"[vectors] built HNSW graph: N={n}")
+        return ann
+
+    def _build_ivfpq(self, vecs: np.ndarray, path: str | None):
+        """IVF-PQ (inner product) with ~4*sqrt(N) cells and 8-bit codes; reuses a saved index if present."""
+        n, d = vecs.shape
+        if faiss is None or n <= _ANN_MIN_ROWS:
+            return None
+        nprobe = int(os.getenv("VECTOR_ANN_NPROBE", "8"))
+        side = f"{path}.ivfpq" if path else None
+        index = None
+        try:
+            if side and os.path.isfile(side) and os.path.getmtime(side) >= os.path.getmtime(path):
+                index = faiss.read_index(side)
+                if index.ntotal != n or index.d != d:
+                    index = None
+        except Exception as e:
+            print(f"[vectors] stale/unreadable IVF-PQ index, rebuilding: {e}")
+            index = None
+        if index is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+            m = next(m for m in (16, 8, 4, 2, 1) if d % m == 0)  # sub-quantizers must split D evenly
+            X = np.ascontiguousarray(vecs, dtype=np.float32)
+            index = faiss.IndexIVFPQ(faiss.IndexFlatIP(d), d, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+            index.train(X)
+            index.add(X)
+            if side:
+                try:
+                    faiss.write_index(index, side)
+                except Exception as e:
+                    print(f"[vectors] could not save IVF-PQ index: {e}")
+            print(f"[vectors] built IVF-PQ index: N={n} nlist={nlist} m={m}")
+        index.nprobe = nprobe
+        return _IVFPQ(index, vecs, self.rerank)
+
+    @staticmethod
+    def _quantize_int8(vecs: np.ndarray):
+        """Symmetric per-row int8 quantization of unit rows: v ~= q * scale."""
+        amax = np.abs(vecs).max(axis=1)
+        amax[amax == 0] = 1.0
+        scale = (amax / 127.0).astype(np.float32)
+        q = _aligned_copy(np.rint(vecs / scale[:, None]), dtype=np.int8)
+        return q, scale
+
+    def _scores(self, Q: np.ndarray, block: int = 16384) -> np.ndarray:
+        """[B, N] cosine scores for normalized queries Q."""
+        V = self.vecs
+        if V.dtype == np.float32:
+            if _simsimd is not None and V.flags.c_contiguous:
+                # rows and queries are unit-length, so cosine distance = 1 - dot
+                return 1.0 - np.asarray(_simsimd.cdist(Q, V, metric="cosine"), dtype=np.float32)
+            return Q @ V.T
+        if V.dtype == np.float16:
+            if _simsimd is not None and V.flags.c_contiguous:
+                # f16 x f16 kernel (F16C / NEON fp16): half the bytes streamed per query
+                return 1.0 - np.asarray(_simsimd.cdist(Q.astype(np.float16), V, metric="cosine"),
+                                        dtype=np.float32)
+            # NumPy has no fp16 GEMM: widen a block at a time, like the int8 fallback below
+            out = np.empty((Q.shape[0], V.shape[0]), dtype=np.float32)
+            for s in range(0, V.shape[0], block):
+                out[:, s:s + block] = Q @ V[s:s + block].astype(np.float32).T
+            return out
+        if _simsimd is not None and V.flags.c_contiguous:
+            # i8 x i8 cosine kernel (VNNI / NEON dot); cosine ignores the per-row scales
+            q8, _ = self._quantize_int8(Q)
+            return 1.0 - np.asarray(_simsimd.cdist(q8, V, metric="cosine"), dtype=np.float32)
+        # int8 rows are widened one block at a time so the float32 scratch stays bounded
+        out = np.empty((Q.shape[0], V.shape[0]), dtype=np.float32)
+        for s in range(0, V.shape[0], block):
+            blk = V[s:s + block].astype(np.float32)
+            out[:, s:s + block] = (Q @ blk.T) * self._scale[s:s + block]
+        return out
 
     def _download_s3(self, bucket: str, prefix: str, tmp_dir: str):
-        """Downloads s3://bucket/prefix/{vectors.npy,meta.jsonl} to tmp_dir."""
-        s3 = boto3.client("s3")
+        """Downloads s3://bucket/prefix/{vectors.npy,meta.jsonl} to tmp_dir (both in parallel, multipart)."""
+        import boto3  # only the S3 path needs it; local loads and tests skip the import
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+        from concurrent.futures import ThreadPoolExecutor
+        conc = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "16"))
+        # pool sized for both transfers' part threads
+        s3 = boto3.client("s3", config=Config(max_pool_connections=2 * conc + 2))
+        xfer = TransferConfig(multipart_threshold=8 << 20, multipart_chunksize=8 << 20,
+                              max_concurrency=conc, use_threads=True)
         os.makedirs(tmp_dir, exist_ok=True)
         idx_key  = f"{prefix.rstrip('/')}/vectors.npy"
         meta_key = f"{prefix.rstrip('/')}/meta.jsonl"
         idx_dst  = os.path.join(tmp_dir, "vectors.npy")
         meta_dst = os.path.join(tmp_dir, "meta.jsonl")
 
-        print(f"[vectors] downloading s3://{bucket}/{idx_key} -> {idx_dst}")
-        s3.download_file(bucket, idx_key, idx_dst)
-        print(f"[vectors] downloading s3://{bucket}/{meta_key} -> {meta_dst}")
-        s3.download_file(bucket, meta_key, meta_dst)
+        def _get(key: str, dst: str):
+            # /tmp outlives a failed init in the same container: skip the transfer if the object
+            # is unchanged (ETag taken before the download, so a concurrent update only costs a re-fetch)
+            etag_path = dst + ".etag"
+            etag = s3.head_object(Bucket=bucket, Key=key)["ETag"]
+            if os.path.isfile(dst) and os.path.isfile(etag_path):
+                with open(etag_path) as f:
+                    if f.read() == etag:
+                        print(f"[vectors] reusing {dst} (unchanged in S3)")
+                        return
+            print(f"[vectors] downloading s3://{bucket}/{key} -> {dst}")
+            s3.download_file(bucket, key, dst, Config=xfer)
+            with open(etag_path, "w") as f:
+                f.write(etag)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futs = [pool.submit(_get, idx_key, idx_dst), pool.submit(_get, meta_key, meta_dst)]
+            for f in futs:
+                f.result()  # re-raise download errors
         return idx_dst, meta_dst
 
+    def prefetch(self, bucket: str, prefix: str):
+        """
+        Start the S3 download on a background thread so it overlaps other init work
+        (e.g. loading the embedder); a later ensure() with the same bucket/prefix waits on it.
+        """
+        if not bucket or self._prefetch is not None:
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=1)
+        self._prefetch = (bucket, prefix, pool.submit(self._download_s3, bucket, prefix, "/tmp/rag_index"))
+        pool.shutdown(wait=False)
+
     def ensure(self, bucket: str = "", prefix: str = ""):
         """
-        Loads the vectors + meta into memory (or from S3), sets self.vecs/meta.
+        Loads the vectors + meta into memory (or from S3), sets self.vecs and the meta columns.
         """
         try:
             if bucket:
-                tmp_dir = "/tmp/rag_index"
-                idx_path, meta_path = self._download_s3(bucket, prefix, tmp_dir)
+                pre, self._prefetch = self._prefetch, None
+                if pre is not None and pre[:2] == (bucket, prefix):
+                    idx_path, meta_path = pre[2].result()  # re-raises a failed prefetch
+                else:
+                    idx_path, meta_path = self._download_s3(bucket, prefix, "/tmp/rag_index")
                 self._load_local(idx_path, meta_path)
             else:
                 # local mode
@@ -117,44 +446,137 @@ class NumpyStore:
             print(f"[vectors] ensure() failed: {e}")
 
     def ready(self) -> bool:
-        return bool(self._ready and self.vecs is not None and self.meta)
+        return bool(self._ready and self.vecs is not None and self._titles)
 
     def size(self) -> int:
         return 0 if self.vecs is None else int(self.vecs.shape[0])
 
-    def search(self, q_vec, k: int = 10):
+    def search(self, q_vec, k: int = 10, min_score: float | None = None, normalized: bool = False):
         """
         Cosine similarity search on L2-normalized vectors.
         Returns a list[dict] with fields:
           - chunk_text, title, source_path, page, score
+        Hits scoring below min_score (if given) are dropped. normalized=True skips
+        re-normalizing a query the caller already scaled to unit length.
+        """
+        q = np.asarray(q_vec, dtype=np.float32)
+        return self.search_batch(q.reshape(1, -1), k=k, min_score=min_score, normalized=normalized)[0]
+
+    def search_batch(self, q_vecs, k: int = 10, min_score: float | None = None, normalized: bool = False):
+        """
+        Batched search: q_vecs is [B, D] (e.g. np.stack(vecs).astype("float32", copy=False)).
+        All queries are scored with one matrix product; returns one hit list per query
+        (empty for zero-norm queries).
         """
+        res = self._search_batch(q_vecs, k, min_score, normalized)
+        if min_score is not None:
+            res = [[h for h in hits if h["score"] >= min_score] for hits in res]
+        return res
+
+    def _search_batch(self, q_vecs, k: int, min_score: float | None, normalized: bool = False):
         if not self.ready():
             raise RuntimeError("Vector index not loaded. Call ensure() and verify paths/bucket/prefix.")
 
         V = self.vecs  # [N, D]
-        q = np.asarray(q_vec, dtype=np.float32)
-        # normalize q
-        n = np.linalg.norm(q)
-        if n == 0:
-            return []
-        q = q / n
-        if V.shape[1] != q.shape[0]:
-            raise ValueError(f"dim mismatch: index_dim={V.shape[1]} query_dim={q.shape[0]}")
-        sims = V @ q  # cosine similarity
+        Q = np.ascontiguousarray(q_vecs, dtype=np.float32)
+        if Q.ndim != 2:
+            raise ValueError(f"expected [B, D] queries, got shape {Q.shape}")
+        if V.shape[1] != Q.shape[1]:
+            raise ValueError(f"dim mismatch: index_dim={V.shape[1]} query_dim={Q.shape[1]}")
+        if Q.shape[0] > _QUERY_BLOCK:
+            # large batches run as a few GEMMs so scratch stays at _QUERY_BLOCK x N floats
+            out = []
+            for s in range(0, Q.shape[0], _QUERY_BLOCK):
+                out.extend(self._search_batch(Q[s:s + _QUERY_BLOCK], k, min_score, normalized))
+            return out
+        if normalized:
+            zero = ~Q.any(axis=1)  # only all-zero rows need detecting
+        else:
+            # normalize all queries at once
+            n2 = _sq_norms(Q)
+            zero = (n2 == 0)
+            n2[zero] = 1.0
+            Q = Q * (1.0 / np.sqrt(n2))[:, None]
         k = min(k, V.shape[0])
-        # partial sort for top-k
-        idx = np.argpartition(-sims, k-1)[:k]
-        idx = idx[np.argsort(-sims[idx])]
+        if self._ann is not None:
+            # approximate: HNSW graph walk or a few IVF cells per query instead of a full scan
+            labels, dists = self._ann.knn_query(Q, k=k)
+            out = []
+            for b in range(Q.shape[0]):
+                keep = labels[b] >= 0  # IVF can come back short when the probed cells are small
+                out.append([] if zero[b] else self._hits(labels[b][keep].astype(np.int64), 1.0 - dists[b][keep]))
+            return out
+        if (top_k_cosine is not None and V.dtype == np.float32 and Q.shape[0] == 1
+                and V.shape[0] > _FUSED_MIN_ROWS and not zero[0]):
+            # single large float32 query: fused dot + top-k, each row read once
+            idx, scores = top_k_cosine(V, Q[0], k, -np.inf if min_score is None else min_score)
+            return [self._hits(idx, scores)]
+        if (V.dtype == np.float32 and self._fp32 is None and Q.shape[0] > 1
+                and V.shape[0] > _FUSED_MIN_ROWS):
+            # several float32 queries over a large index: row tiles stay cache-resident for the whole batch
+            idx, scores = self._tiled_top_k(Q, k)
+            return [[] if zero[b] else self._hits(idx[b], scores[b]) for b in range(Q.shape[0])]
+        sims = self._scores(Q)  # [B, N] cosine similarity
+        rerank = self._fp32 is not None
+        kc = min(k * self.rerank, V.shape[0]) if rerank else k
+        # partial sort for top-k (or the rerank candidates), row-wise
+        top = np.argpartition(-sims, kc-1, axis=1)[:, :kc]
+
+        results = []
+        for b in range(Q.shape[0]):
+            if zero[b]:
+                results.append([])
+                continue
+            row = sims[b]
+            if rerank:
+                # exact float32 cosine on the few candidates recovers quantization drift
+                cand = np.sort(top[b])
+                R = np.asarray(self._fp32[cand], dtype=np.float32)
+                rn2 = _sq_norms(R)
+                rn2[rn2 == 0] = 1.0
+                exact = (R @ Q[b]) / np.sqrt(rn2)
+                order = np.argsort(-exact)[:k]
+                idx, scores = cand[order], exact[order]
+            else:
+                idx = top[b][np.argsort(-row[top[b]])]
+                scores = row[idx]
+            results.append(self._hits(idx, scores))
+        return results
 
+    def _tiled_top_k(self, Q: np.ndarray, k: int):
+        """
+        Top-k per query over row tiles of V sized to ~half of L2, so each tile is read from DRAM
+        once and reused by every query in Q; keeps a running [B, k] candidate set instead of a
+        [B, N] score matrix. Returns (idx, scores), both [B, k], sorted by descending score.
+        """
+        V = self.vecs
+        N, D = V.shape
+        # floor of 1024 rows keeps the per-tile Python overhead small next to the GEMM
+        rows = _ROW_TILE or max(1024, (_L2_BYTES // 2) // (D * V.dtype.itemsize))
+        best_s = np.full((Q.shape[0], k), -np.inf, dtype=np.float32)
+        best_i = np.zeros((Q.shape[0], k), dtype=np.int64)
+        for s in range(0, N, rows):
+            S = Q @ V[s:s + rows].T  # [B, tile]
+            kk = min(k, S.shape[1])
+            part = np.argpartition(-S, kk - 1, axis=1)[:, :kk]
+            cand_s = np.concatenate([best_s, np.take_along_axis(S, part, axis=1)], axis=1)
+            cand_i = np.concatenate([best_i, part + s], axis=1)
+            keep = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(cand_s, keep, axis=1)
+            best_i = np.take_along_axis(cand_i, keep, axis=1)
+        order = np.argsort(-best_s, axis=1)
+        return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+
+    def _hits(self, idx, scores) -> list[dict]:
+        """Result dicts for row indices + scores, gathered from the meta columns."""
+        ids = idx.tolist()
+        if not ids:
+            return []
+        # one C-level gather per column instead of four list lookups per hit
+        take = itemgetter(*ids) if len(ids) > 1 else (lambda col: (col[ids[0]],))
         out = []
-        for i in idx:
-            m = self.meta[i] if i < len(self.meta) else {}
-            out.append({
-                "chunk_text": m.get("chunk_text") or m.get("text") or "",
-                "title": m.get("title"),
-                "source_path": m.get("source_path") or m.get("source") or m.get("url"),
-                "page": m.get("page"),
-                "score": float(sims[i]),
-                "meta": m,
-            })
+        for c, t, src, pg, sc in zip(take(self._texts), take(self._titles), take(self._sources),
+                                     take(self._pages), scores.tolist()):
+            m = {"chunk_text": c, "title": t, "source_path": src, "page": pg}
+            out.append({**m, "score": sc, "meta": m})
         return out
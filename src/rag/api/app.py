@@ -1,18 +1,23 @@
 # src/rag/api/app.py
 import base64
 import boto3, botocore
-import json, os, re, time, logging, hashlib, threading
+from botocore.config import Config
+import numpy as np
+import asyncio, os, random, re, time, logging, hashlib, threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 import rag.core.config as cfgmod
+from rag.core.jsonutil import dumps as _json_dumps, loads as _json_loads
 
-try:
-    # Optional: used only for local dev
-    from fastapi import FastAPI, Request  # pyright: ignore[reportMissingImports]
-    from fastapi.responses import JSONResponse  # pyright: ignore[reportMissingImports]
-except Exception:
-    FastAPI = None   # type: ignore
-    Request = None   # type: ignore
-    JSONResponse = None  # type: ignore
+FastAPI = Request = JSONResponse = None  # type: ignore
+if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+    # Optional: used only for local dev; Lambda never loads fastapi/starlette/pydantic
+    try:
+        from fastapi import FastAPI, Request  # pyright: ignore[reportMissingImports]
+        from fastapi.responses import JSONResponse  # pyright: ignore[reportMissingImports]
+    except Exception:
+        FastAPI = Request = JSONResponse = None  # type: ignore
 
 # ------------------ Config ------------------
 config = cfgmod.AppConfig()
@@ -45,16 +50,29 @@ CACHE_MAX_ITEMS_T1     = config.cache_max_items_t1
 CACHE_TIER2_DDB_ENABLED= config.cache_tier2_ddb_enabled
 DDB_CACHE_TABLE        = config.ddb_cache_table
 CACHE_TTL_SECONDS_T2   = config.cache_ttl_seconds_t2
+# stream the LLM response (text parsed as it arrives; time-to-first-token lands in phase_ms)
+LLM_STREAM             = os.getenv("LLM_STREAM", "1") == "1"
+# window for coalescing concurrent query embeddings; a Lambda container serves one request at a time
+EMBED_BATCH_WAIT_MS    = float(os.getenv("EMBED_BATCH_WAIT_MS", "0" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "5"))
+# fraction of /chat requests that emit the [telemetry] line (1 = all)
+TELEMETRY_SAMPLE_RATE  = float(os.getenv("TELEMETRY_SAMPLE_RATE", "1"))
 
 # ------------------ Globals ------------------
 _rag_ready   = False
 _rag_error   = None
 _run_chat_fn = None
+_rag_failed_at = 0.0  # time.time() of the last failed init
+_INIT_RETRY_SEC = float(os.getenv("RAG_INIT_RETRY_SEC", "30"))  # min gap between init retries
 _dynamo      = None  # created lazily
+_IO_POOL     = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-io")  # overlapped network calls
+# shared by the long-lived clients: keep-alive pool reused across requests, adaptive retries absorb throttling
+_BOTO_CFG    = Config(retries={"max_attempts": 3, "mode": "adaptive"}, tcp_keepalive=True, max_pool_connections=16)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-logger.addHandler(logging.StreamHandler())
+if not logger.handlers:
+    # the Lambda runtime already installs a root handler; a second one would emit every record twice
+    logger.addHandler(logging.StreamHandler())
 logger = logging.getLogger("diag")
 
 _LOGGED_IDENTITY = False
@@ -62,14 +80,47 @@ _FOLLOWUP_RE = re.compile(
     r'^\s*(more( details| info| examples)?|examples?\??|show (me )?examples?|expand|elaborate|deep[\s-]*dive|drill down|tell me more)\b',
     re.I
 )
+# System prompt for grounded answers (built once at import, not per request)
+_SYSTEM_PROMPT = """
+                    You are a senior developer advocate for this repository.
+                    Primary source of truth is the provided Context. Answer the user’s question by strictly prioritizing that context.
+
+                    When to enrich:
+                    If the question is generic (e.g., concepts commonly covered in vendor documentation like AWS, Google, OpenAI) and the Context is thin or lacks definitions, you may add well-established, widely accepted public knowledge. Keep such additions brief and label them as _General background (public)_.
+
+                    Do / Don’t
+                    - DO use the most relevant passages from Context; be concise & structured.
+                    - DO structure the answer using Slack-friendly formatting:
+                        *Title (bold, one line)*
+                        *Bold sub-section lines* followed by short bullet points.
+                    - DO include a **References (corpus)** section listing only items from Context (title/path and page if available). Do not fabricate links.
+                    - DO prefer Context when public knowledge conflicts.
+                    - DON’T invent proprietary details or API contracts not in Context.
+                    - DON’T cite public sources unless they appear in Context.
+
+                    Fallbacks
+                    - If the Context is insufficient to answer meaningfully, say so briefly and provide 2–3 next steps (docs/sections/terms to search).
+                    - If the user asks for API contracts and the Context doesn’t contain them, point to the section/page where contracts live (if present); otherwise state it isn’t available in the corpus.
+
+                    Follow-ups
+                    - If the user follow-up is short (“more”, “examples”, “elaborate”), treat it as a request to expand the previous answer on the same topic, and prefer the same sources unless the user names a new focus.
+
+                    Output format (Slack)
+                    - *Title (bold, one line)*
+                    - *Subsection (bold)* then 2–4 bullets (concise)
+                    - Optional tiny example (≤10 lines) only if materially helpful
+                    - Optional _General background (public)_ (≤3 bullets)
+                    - *References (corpus)*: bullets with titles/paths/pages from Context only
+                """.strip()
+_EXAMPLES_RE = re.compile(r'\b(example|examples?|code|cli|how to|snippet)\b', re.I)
 _MEMORY: dict[str, dict] = {}
 _MEM_LRU: "OrderedDict[str, dict]" = OrderedDict()
 _MEM_MAX = int(os.getenv("CACHE_MAX_ITEMS", "1000"))
 
+_QNORM = str.maketrans({"“": '"', "”": '"', "’": "'", "\u00A0": " "})  # one C-level pass, not four replace() scans
+
 def _normalize_q(s: str) -> str:
-    s = (s or "")
-    s = s.replace("“", '"').replace("”", '"').replace("’", "'").replace("\u00A0", " ")
-    return " ".join(s.lower().split())
+    return " ".join((s or "").translate(_QNORM).lower().split())
 
 def _mem_key(q: str, domain: str|None, version: str="v1") -> str:
     base = f"{(domain or 'default')}|{version}|{q.strip().lower()}"
@@ -87,11 +138,73 @@ def _mem_put(k: str, v: dict):
     while len(_MEM_LRU) > _MEM_MAX:
         _MEM_LRU.popitem(last=False)
 
+# ---- Semantic answer cache (near-duplicate queries, in memory) ----
+# ring buffer of recent unit query vectors; a new query within SEMANTIC_CACHE_MIN_SIM cosine
+# of one (same domain + examples intent, not expired) reuses its answer and skips search + LLM
+_SEM_MAX = int(os.getenv("SEMANTIC_CACHE_SIZE", "0"))  # opt-in: 0 disables until MIN_SIM is validated on golden
+_SEM_MIN_SIM = float(os.getenv("SEMANTIC_CACHE_MIN_SIM", "0.9"))
+_SEM_TTL = int(os.getenv("SEMANTIC_CACHE_TTL_SEC", "900"))
+_SEM_LOCK = threading.Lock()
+_SEM_VECS: np.ndarray | None = None  # [_SEM_MAX, D]
+_SEM_ENTRIES: list[tuple] = []        # (key, expires_at, payload), row i <-> _SEM_VECS[i]
+_SEM_NEXT = 0
+
+def _unit_inplace(v: np.ndarray) -> np.ndarray:
+    """L2-normalize a float32 query row in place (zero rows stay zero); one dot, one scale."""
+    n = float(np.sqrt(v @ v))
+    if n > 0:
+        v *= np.float32(1.0 / n)
+    return v
+
+def _sem_unit(vec) -> np.ndarray | None:
+    # /chat normalizes the query once after embedding; only zero rows are rejected here
+    v = np.asarray(vec, dtype=np.float32)
+    return v if v.any() else None
+
+def _sem_get(vec, key: tuple) -> dict | None:
+    # key = (domain, wants_examples): both change the answer for the same question
+    if _SEM_MAX <= 0 or _SEM_VECS is None:
+        return None
+    q = _sem_unit(vec)
+    if q is None or q.shape[0] != _SEM_VECS.shape[1]:
+        return None
+    now = time.time()
+    with _SEM_LOCK:
+        sims = _SEM_VECS[:len(_SEM_ENTRIES)] @ q
+        for i in np.argsort(-sims):
+            if sims[i] < _SEM_MIN_SIM:
+                break
+            k, expires_at, payload = _SEM_ENTRIES[i]
+            if k == key and expires_at > now:
+                return payload
+    return None
+
+def _sem_put(vec, key: tuple, payload: dict):
+    global _SEM_VECS, _SEM_NEXT
+    if _SEM_MAX <= 0:
+        return
+    q = _sem_unit(vec)
+    if q is None:
+        return
+    with _SEM_LOCK:
+        if _SEM_VECS is None or _SEM_VECS.shape[1] != q.shape[0]:
+            _SEM_VECS = np.zeros((_SEM_MAX, q.shape[0]), dtype=np.float32)
+            _SEM_ENTRIES.clear()
+            _SEM_NEXT = 0
+        i = _SEM_NEXT
+        _SEM_VECS[i] = q
+        entry = (key, time.time() + _SEM_TTL, payload)
+        if i < len(_SEM_ENTRIES):
+            _SEM_ENTRIES[i] = entry  # overwrite the oldest slot
+        else:
+            _SEM_ENTRIES.append(entry)
+        _SEM_NEXT = (i + 1) % _SEM_MAX
+
 # ---- Tier-2 DynamoDB cache (optional) ----
 def _get_ddb():
     global _dynamo
     if _dynamo is None:
-        _dynamo = boto3.client("dynamodb", region_name=AWS_REGION)
+        _dynamo = boto3.client("dynamodb", region_name=AWS_REGION, config=_BOTO_CFG)
     return _dynamo
 
 def _cache_key(q: str, domain: str | None, version: str | None = None) -> str:
@@ -114,8 +227,8 @@ def _cache_get(q: str, domain: str | None) -> dict | None:
             return None
         return {
             "answer": item.get("answer", {}).get("S"),
-            "citations": json.loads(item.get("cit", {}).get("S", "[]")),
-            "diag": json.loads(item.get("diag", {}).get("S", "{}")),
+            "citations": _json_loads(item.get("cit", {}).get("S", "[]")),
+            "diag": _json_loads(item.get("diag", {}).get("S", "{}")),
         }
     except Exception:
         return None
@@ -132,8 +245,8 @@ def _cache_put(q: str, domain: str | None, answer: str, citations: list, diag: d
             ExpressionAttributeNames={"#a": "answer", "#c": "cit", "#d": "diag", "#t": "ttl"},
             ExpressionAttributeValues={
                 ":a": {"S": (answer or "")[:390000]},
-                ":c": {"S": json.dumps(citations, ensure_ascii=False)[:200000]},
-                ":d": {"S": json.dumps(diag, ensure_ascii=False)[:200000]},
+                ":c": {"S": _json_dumps(citations).decode("utf-8")[:200000]},
+                ":d": {"S": _json_dumps(diag).decode("utf-8")[:200000]},
                 ":t": {"N": str(int(time.time()) + CACHE_TTL_SECONDS_T2)},
             },
         )
@@ -143,16 +256,18 @@ def _cache_put(q: str, domain: str | None, answer: str, citations: list, diag: d
 
 # ------------------ Helpers ------------------
 def _log_identity_once():
+    # one attempt per container, on a background thread (see bottom of module): STS stays off /chat
     global _LOGGED_IDENTITY
     if _LOGGED_IDENTITY:
         return
+    _LOGGED_IDENTITY = True
     try:
-        sts = boto3.client("sts", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        # own Session: the default one is busy building the init clients on another thread
+        sts = boto3.session.Session().client("sts", region_name=os.getenv("AWS_REGION", "us-east-1"))
         ident = sts.get_caller_identity()
-        msg = f"[diag] caller_identity arn={ident.get('Arn')} account={ident.get('Account')} region={os.getenv('AWS_REGION','us-east-1')}"
+        msg = (f"[diag] caller_identity arn={ident.get('Arn')} account={ident.get('Account')} "
+               f"region={os.getenv('AWS_REGION','us-east-1')} boto3={boto3.__version__} botocore={botocore.__version__}")
         logger.info(msg)
-        print(msg)
-        _LOGGED_IDENTITY = True
     except Exception as e:
         logger.exception("[diag] sts error: %s", e)
 
@@ -164,25 +279,93 @@ def _remember(session_id: str, **kwargs):
     st.update(kwargs)
     _MEMORY[session_id] = st
 
+class _EmbedBatcher:
+    """
+    Coalesces concurrent single-text embed_np() calls into one batched embedder call.
+    The first caller in a window waits EMBED_BATCH_WAIT_MS, embeds everything queued by then
+    and hands each waiter its vector; a text already queued or in flight joins that call
+    instead of starting another. Other attributes pass through to the wrapped embedder.
+    """
+    def __init__(self, embedder, wait_ms: float):
+        self._embedder = embedder
+        self._wait = wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._pending: list[tuple[str, dict]] = []
+        self._inflight: dict[str, dict] = {}  # text -> slot, until its batch completes
+
+    def __getattr__(self, name):
+        return getattr(self._embedder, name)
+
+    def embed_np(self, texts: list[str]) -> np.ndarray:
+        if len(texts) != 1:
+            return self._embedder.embed_np(texts)
+        leader = False
+        with self._lock:
+            slot = self._inflight.get(texts[0])
+            if slot is None:
+                slot = self._inflight[texts[0]] = {"done": threading.Event()}
+                self._pending.append((texts[0], slot))
+                leader = len(self._pending) == 1
+        if leader:
+            time.sleep(self._wait)  # let concurrent requests join this batch
+            with self._lock:
+                batch, self._pending = self._pending, []
+            try:
+                vecs = self._embedder.embed_np([t for t, _ in batch])
+                for i, (_, s) in enumerate(batch):
+                    s["vec"] = vecs[i:i + 1]
+            except Exception as e:
+                for _, s in batch:
+                    s["err"] = e
+            finally:
+                with self._lock:
+                    for t, _ in batch:
+                        self._inflight.pop(t, None)
+                for _, s in batch:
+                    s["done"].set()
+        slot["done"].wait()
+        if "err" in slot:
+            raise slot["err"]
+        return slot["vec"].copy()  # waiters on one text share the slot; callers normalize in place
+
 # ------------------ RAG init ------------------
+_INIT_LOCK = threading.Lock()
+
 def _init_rag():
     """
     Build a minimal RAG pipeline; never crash Lambda init.
     If anything fails, stash the error for /health and /chat.
     """
-    global _rag_ready, _rag_error, _run_chat_fn
     if _run_chat_fn is not None or _rag_ready:
         return
+    if _rag_error and time.time() - _rag_failed_at < _INIT_RETRY_SEC:
+        return  # init runs at import; after a failure, /chat retries it at most every RAG_INIT_RETRY_SEC
+    with _INIT_LOCK:  # a background warm-up and the first /chat may race here
+        _init_rag_locked()
 
-    llm_client = None
-    print(f"[diag] LLM_PROVIDER={LLM_PROVIDER}, LLM_MODEL_ID={LLM_MODEL_ID}, EMBED_PROVIDER={EMBED_PROVIDER}")
-    if LLM_PROVIDER == "bedrock" and LLM_MODEL_ID:
-        logger.info(f"[llm] initializing Bedrock client, bedrock_region={BEDROCK_REGION}")
-        llm_client = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION)
+def _init_rag_locked():
+    global _rag_ready, _rag_error, _run_chat_fn, _rag_failed_at
+    if _run_chat_fn is not None or _rag_ready:
+        return
 
+    print(f"[diag] LLM_PROVIDER={LLM_PROVIDER}, LLM_MODEL_ID={LLM_MODEL_ID}, EMBED_PROVIDER={EMBED_PROVIDER}")
     try:
+        # inside the try: this runs at import in Lambda, so a client error must land in _rag_error
+        llm_client = None
+        if LLM_PROVIDER == "bedrock" and LLM_MODEL_ID:
+            logger.info(f"[llm] initializing Bedrock client, bedrock_region={BEDROCK_REGION}")
+            llm_client = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION, config=_BOTO_CFG)
+
         cfg = config  # use env for bucket/prefix/paths
 
+        # Vector store (NumPy); the S3 download starts now and overlaps the embedder load below
+        from rag.adapters.vs_numpy import NumpyStore
+        print(f"[vectors] bucket={cfg.s3_bucket} prefix={cfg.index_prefix}")
+        print(f"[vectors] expecting: s3://{cfg.s3_bucket}/{cfg.index_prefix}/vectors.npy and meta.jsonl")
+        vector = NumpyStore(cfg.index_path, cfg.meta_path)
+        if cfg.use_s3_index and cfg.s3_bucket:
+            vector.prefetch(cfg.s3_bucket, cfg.index_prefix)
+
         # Embeddings
         if EMBED_PROVIDER == "bedrock":
             from rag.adapters.embeddings_bedrock import BedrockEmbedder as Embedder
@@ -190,12 +373,8 @@ def _init_rag():
         else:
             from rag.adapters.embeddings_local import LocalEmbedder as Embedder
             embedder = Embedder(cfg.model_name)
-
-        # Vector store (NumPy)
-        from rag.adapters.vs_numpy import NumpyStore
-        print(f"[vectors] bucket={cfg.s3_bucket} prefix={cfg.index_prefix}")
-        print(f"[vectors] expecting: s3://{cfg.s3_bucket}/{cfg.index_prefix}/vectors.npy and meta.jsonl")
-        vector = NumpyStore(cfg.index_path, cfg.meta_path)
+        if EMBED_BATCH_WAIT_MS > 0:
+            embedder = _EmbedBatcher(embedder, EMBED_BATCH_WAIT_MS)
 
         if cfg.use_s3_index:
             if not cfg.s3_bucket:
@@ -218,51 +397,55 @@ def _init_rag():
             )
 
         # ---- utilities in the closure ----
-        def _normalize_vec(v):
-            s = sum(x * x for x in v) ** 0.5
-            if s < 1e-8:
-                return [0.0 for _ in v]
-            return [float(x / s) for x in v]
-        
-        def _as_scored_hits(raw_hits):
-            out = []
-            for h in raw_hits or []:
-                score = h.get("score")
-                if score is None and "distance" in h:
-                    d = float(h["distance"])
-                    score = 1.0 - 0.5 * (d ** 2)  # convert L2 on unit vecs to cosine-like
-                try:
-                    score = float(score)
-                except Exception:
-                    score = 0.0
-                out.append({
-                    "chunk_text": h.get("chunk_text") or h.get("text") or "",
-                    "title": h.get("title"),
-                    "source_path": h.get("source_path") or h.get("source") or h.get("url"),
-                    "page": h.get("page"),
-                    "score": score,
-                    "meta": h.get("meta") or {},
-                })
-            return out
+        # request body pre-encoded per system prompt (there are two); only the user prompt is encoded per call
+        _body_parts: dict[str, tuple[bytes, bytes]] = {}
 
-        def _llm_complete(system_prompt: str, user_prompt: str, _json_mod=json) -> str | None:
-            if not llm_client or not LLM_MODEL_ID:
-                return None
-            try:
-                body = {
+        def _llm_body(system_prompt: str, user_prompt: str) -> bytes:
+            parts = _body_parts.get(system_prompt)
+            if parts is None:
+                tmpl = _json_dumps({
                     "anthropic_version": "bedrock-2023-05-31",
                     "max_tokens": MAX_TOKENS,
                     "temperature": TEMPERATURE,
                     "system": system_prompt,
-                    "messages": [{"role": "user", "content": [{"type": "text", "text": user_prompt}]}],
-                }
+                    "messages": [{"role": "user", "content": [{"type": "text", "text": "__USR__"}]}],
+                })
+                head, _, tail = tmpl.rpartition(b'"__USR__"')  # messages is the last key
+                parts = _body_parts[system_prompt] = (head, tail)
+            return parts[0] + _json_dumps(user_prompt) + parts[1]
+
+        def _llm_complete(system_prompt: str, user_prompt: str, timings: dict | None = None) -> str | None:
+            if not llm_client or not LLM_MODEL_ID:
+                return None
+            try:
+                body = _llm_body(system_prompt, user_prompt)
+                if LLM_STREAM:
+                    # deltas are decoded while the rest of the generation is still in flight
+                    t_req = time.perf_counter()
+                    resp = llm_client.invoke_model_with_response_stream(
+                        modelId=LLM_MODEL_ID,
+                        body=body,
+                        contentType="application/json",
+                        accept="application/json",
+                    )
+                    parts = []
+                    for ev in resp["body"]:
+                        chunk = ev.get("chunk")
+                        if not chunk:
+                            continue
+                        d = _json_loads(chunk["bytes"])
+                        if d.get("type") == "content_block_delta" and d["delta"].get("type") == "text_delta":
+                            if not parts and timings is not None:
+                                timings["llm_ttft_ms"] = round((time.perf_counter() - t_req) * 1000.0, 1)
+                            parts.append(d["delta"]["text"])
+                    return "".join(parts).strip() or None
                 resp = llm_client.invoke_model(
                     modelId=LLM_MODEL_ID,
-                    body=_json_mod.dumps(body).encode("utf-8"),
+                    body=body,
                     contentType="application/json",
                     accept="application/json",
                 )
-                out = json.loads(resp["body"].read())
+                out = _json_loads(resp["body"].read())
                 txt = "".join(p.get("text", "") for p in out.get("content", []) if p.get("type") == "text").strip()
                 return txt or None
             except Exception:
@@ -282,7 +465,7 @@ def _init_rag():
                 # Follow-up stitching
                 focus = None
                 if followup:
-                    focus = re.sub(_FOLLOWUP_RE, "", q_user, count=1, flags=re.I).strip(" ?.!-–—")
+                    focus = _FOLLOWUP_RE.sub("", q_user, count=1).strip(" ?.!-–—")
                 if followup and prev.get("last_q"):
                     q_text = f"{prev['last_q']}" if not focus else f"{prev['last_q']} — focus on '{focus}'"
                 else:
@@ -313,6 +496,13 @@ def _init_rag():
                             last_sources=[c.get("source_path") for c in out.get("citations", []) if c.get("source_path")])
                     return out
 
+                # the query embedding doesn't depend on the DDB lookup: start it now so both round
+                # trips overlap on a miss (on a hit the vector is discarded; it stays in the embed LRU)
+                t0 = time.perf_counter()
+                embed_fut = None
+                if CACHE_TIER2_DDB_ENABLED and DDB_CACHE_TABLE:
+                    embed_fut = _IO_POOL.submit(embedder.embed_np, [q_text])
+
                 # ---- Tier-2 DynamoDB cache (warm) ----
                 ddb_hit = _cache_get(q_text, domain)
                 if ddb_hit:
@@ -337,10 +527,10 @@ def _init_rag():
                     return out
 
                 # ---- Retrieve ----
-            # q_vec = _normalize_vec(embedder.embed([q_text])[0])
-                t0 = time.perf_counter()
                 try:
-                    q_vec = _normalize_vec(embedder.embed([q_text])[0])
+                    # float32 row straight from the embedder (no list of Python floats), normalized
+                    # once here for the semantic cache and the search alike
+                    q_vec = _unit_inplace((embed_fut.result() if embed_fut else embedder.embed_np([q_text]))[0])
                 except Exception:
                     # If embedding fails unexpectedly, degrade gracefully
                     _remember(session_id, last_q=q_text)
@@ -359,11 +549,32 @@ def _init_rag():
                     _mem_put(mem_k, out_payload)
                     return out_payload
                 pm["embed_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
-                
+
+                # ---- Semantic cache: a near-duplicate of a recent question reuses its answer ----
+                # (follow-ups embed close to their base question but want a different answer)
+                wants_examples = bool(_EXAMPLES_RE.search(q_user))
+                sem_key = (domain, wants_examples)
+                sem_hit = None if followup else _sem_get(q_vec, sem_key)
+                if sem_hit:
+                    out = {
+                        **sem_hit,
+                        "session_id": session_id,
+                        "diag": {
+                            **sem_hit.get("diag", {}),
+                            "cache": "hot-sem",
+                            "phase_ms": {**pm, "total": round((time.perf_counter() - t_all) * 1000.0, 1)}
+                        },
+                    }
+                    _remember(session_id,
+                            last_q=q_text,
+                            last_sources=[c.get("source_path") for c in out.get("citations", []) if c.get("source_path")])
+                    _mem_put(mem_k, out)
+                    return out
+
                 # ---- Search (timed + guarded) ----
                 t1 = time.perf_counter()
                 try:
-                    raw_hits = vector.search(q_vec, RETRIEVE_K)
+                    raw_hits = vector.search(q_vec, RETRIEVE_K, normalized=True)
                 except Exception:
                     _remember(session_id, last_q=q_text)
                     out_payload = {
@@ -380,21 +591,24 @@ def _init_rag():
                     _mem_put(mem_k, out_payload)
                     return out_payload
                 pm["search_ms"] = round((time.perf_counter() - t1) * 1000.0, 1)
-                hits = _as_scored_hits(raw_hits)
+                # NumpyStore hits already carry the final schema (chunk_text/title/source_path/page,
+                # float score, meta): used as-is, no second pass re-boxing every field
+                hits = raw_hits
 
                 # tiny soft re-rank for follow-ups: prefer last sources & focus
                 if followup:
                     prev_sources = set(prev.get("last_sources") or [])
-                    focus_l = (focus or "").lower()
+                    # one case-insensitive matcher for all hits instead of lower()-copying every chunk
+                    focus_re = re.compile(re.escape(focus), re.I) if focus else None
                     buff = []
                     for h in hits:
                         boost = 0.0
-                        if (h.get("source_path") or "") in prev_sources:
+                        if (h["source_path"] or "") in prev_sources:
                             boost += 0.10
-                        if focus_l and (focus_l in (h.get("title") or "").lower() or focus_l in (h.get("chunk_text") or "").lower()):
+                        if focus_re and (focus_re.search(h["title"] or "") or focus_re.search(h["chunk_text"])):
                             boost += 0.05
-                        buff.append({**h, "score": float(h.get("score") or 0.0) + boost})
-                    hits = sorted(buff, key=lambda x: x["score"], reverse=True)
+                        buff.append({**h, "score": h["score"] + boost})
+                    hits = sorted(buff, key=itemgetter("score"), reverse=True)
 
                 # No hits -> fallback or strict
                 if not hits:
@@ -426,65 +640,35 @@ def _init_rag():
                 good = [h for h in hits if h["score"] >= FALLBACK_MIN_SCORE]
                 use_hits = (good or hits)[:CONTEXT_K]
 
-                # Build context snippets
-                context_snippets = []
+                # Build context snippets (trimmed once per hit; the extraction fallback reuses them)
+                snippets = []
                 for h in use_hits:
                     t = (h["chunk_text"] or "").strip()
                     if len(t) > SNIPPET_CHARS:
                         t = t[:SNIPPET_CHARS].rstrip() + "…"
-                    if t:
-                        context_snippets.append(t)
-
-                # System prompt
-                system = """
-                    You are a senior developer advocate for this repository.
-                    Primary source of truth is the provided Context. Answer the user’s question by strictly prioritizing that context.
+                    snippets.append(t)
+                context_snippets = [t for t in snippets if t]
 
-                    When to enrich:
-                    If the question is generic (e.g., concepts commonly covered in vendor documentation like AWS, Google, OpenAI) and the Context is thin or lacks definitions, you may add well-established, widely accepted public knowledge. Keep such additions brief and label them as _General background (public)_.
+                system = _SYSTEM_PROMPT
 
-                    Do / Don’t
-                    - DO use the most relevant passages from Context; be concise & structured.
-                    - DO structure the answer using Slack-friendly formatting:
-                        *Title (bold, one line)*
-                        *Bold sub-section lines* followed by short bullet points.
-                    - DO include a **References (corpus)** section listing only items from Context (title/path and page if available). Do not fabricate links.
-                    - DO prefer Context when public knowledge conflicts.
-                    - DON’T invent proprietary details or API contracts not in Context.
-                    - DON’T cite public sources unless they appear in Context.
-
-                    Fallbacks
-                    - If the Context is insufficient to answer meaningfully, say so briefly and provide 2–3 next steps (docs/sections/terms to search).
-                    - If the user asks for API contracts and the Context doesn’t contain them, point to the section/page where contracts live (if present); otherwise state it isn’t available in the corpus.
-
-                    Follow-ups
-                    - If the user follow-up is short (“more”, “examples”, “elaborate”), treat it as a request to expand the previous answer on the same topic, and prefer the same sources unless the user names a new focus.
-
-                    Output format (Slack)
-                    - *Title (bold, one line)*
-                    - *Subsection (bold)* then 2–4 bullets (concise)
-                    - Optional tiny example (≤10 lines) only if materially helpful
-                    - Optional _General background (public)_ (≤3 bullets)
-                    - *References (corpus)*: bullets with titles/paths/pages from Context only
-                """.strip()
-
-                wants_examples = bool(re.search(r'\b(example|examples?|code|cli|how to|snippet)\b', q_user, re.I))
                 extras = "\nUser intent: The user asked for EXAMPLES; prioritize corpus examples and tiny code/CLI snippets.\n" if wants_examples else ""
                 user = f"Question: {q_text}\n\n{extras}Context:\n- " + "\n- ".join(context_snippets)
 
-                _log_identity_once()
                 t2 = time.perf_counter()
-                final = _llm_complete(system, user)
+                final = _llm_complete(system, user, timings=pm)
                 pm["llm_ms"] = round((time.perf_counter() - t2) * 1000.0, 1) if final is not None else 0.0
 
 
                 if not final:
                     # extraction fallback
                     bullets = []
-                    for i, h in enumerate(use_hits[:3], 1):
-                        txt = (h["chunk_text"] or h.get("title") or "").replace("\n", " ").strip()
-                        if len(txt) > SNIPPET_CHARS:
-                            txt = txt[:SNIPPET_CHARS].rstrip() + "…"
+                    for i, (h, snip) in enumerate(zip(use_hits[:3], snippets), 1):
+                        if h["chunk_text"]:
+                            txt = snip.replace("\n", " ")
+                        else:
+                            txt = (h.get("title") or "").replace("\n", " ").strip()
+                            if len(txt) > SNIPPET_CHARS:
+                                txt = txt[:SNIPPET_CHARS].rstrip() + "…"
                         bullets.append(f"- {txt} [^{i}]")
                     answer = "**High-level:** Retrieved relevant passages.\n\n" + "\n".join(bullets)
                     fallback_used = True
@@ -536,6 +720,9 @@ def _init_rag():
                 # Populate caches
                 _mem_put(mem_k, out_payload)
                 _cache_put(q_text, domain, out_payload["answer"], citations, out_payload.get("diag", {}))
+                if not followup:
+                    # a follow-up's stitched query + session-reranked answer must not serve other sessions
+                    _sem_put(q_vec, sem_key, out_payload)
 
                 return out_payload
            except Exception as e:
@@ -560,13 +747,14 @@ def _init_rag():
     except Exception:
         logging.getLogger("rag.api").exception("[api] init failed")
         _rag_error = "Initialization failed"
+        _rag_failed_at = time.time()
 
 # ------------------ HTTP glue ------------------
-def _json(status: int, body: dict, headers: dict | None = None, _json_mod=json):
+def _json(status: int, body: dict, headers: dict | None = None):
     h = {"Content-Type": "application/json"}
     if headers:
         h.update(headers)
-    return {"statusCode": status, "headers": h, "body": _json_mod.dumps(body, ensure_ascii=False)}
+    return {"statusCode": status, "headers": h, "body": _json_dumps(body).decode("utf-8")}
 
 def handler(event, context):
     """
@@ -574,8 +762,6 @@ def handler(event, context):
       GET  /health
       POST /chat   (JSON: {"user_msg": "...", "session_id":"...", "domain": null})
     """
-    _log_identity_once()
-    logger.info(f"boto3={boto3.__version__}, botocore={botocore.__version__}")
     global _rag_ready, _run_chat_fn, _rag_error
 
     try:
@@ -590,13 +776,13 @@ def handler(event, context):
             except Exception:
                 body_str = ""
         try:
-            payload = json.loads(body_str) if body_str else {}
+            payload = _json_loads(body_str) if body_str else {}
         except Exception:
             payload = {}
 
         # /health
+        # reports state only: never pays for model/index loading (that runs at init or on /chat)
         if method == "GET" and path.endswith("/health"):
-            _init_rag()
             resp = {"ok": True, "rag_ready": _rag_ready}
             try:
                 resp["index_ready"] = True if _rag_ready else False
@@ -637,7 +823,10 @@ def handler(event, context):
                 error_reason  = d.get("reason")
 
 
-                logger.info("[telemetry] %s", json.dumps({
+                if not logger.isEnabledFor(logging.INFO) or (
+                        TELEMETRY_SAMPLE_RATE < 1.0 and random.random() >= TELEMETRY_SAMPLE_RATE):
+                    return _json(200, out)
+                logger.info("[telemetry] %s", _json_dumps({
                     "latency_ms": elapsed_ms,
                     "max_score": round(float(max_score), 3) if isinstance(max_score, (int, float)) else 0.0,
                     "scores": [round(float(s), 3) for s in scores[:5] if isinstance(s, (int, float))],
@@ -650,7 +839,7 @@ def handler(event, context):
                     "phase_ms": phase_ms,
                     "error_tag": error_tag,
                     "error_reason": error_reason  
-                }))
+                }).decode("utf-8"))
                 return _json(200, out)
             except Exception:
                 logger.exception("[chat] unhandled error")
@@ -668,11 +857,31 @@ IS_LAMBDA = bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
 print(f"[diag] IS_LAMBDA={IS_LAMBDA}")
 app = FastAPI() if not IS_LAMBDA else None
 
+def _start_warmup(block: bool):
+    if os.getenv("RAG_DIAG_IDENTITY", "1") == "1":
+        threading.Thread(target=_log_identity_once, name="rag-identity", daemon=True).start()
+    if os.getenv("RAG_PREWARM", "1") != "1":
+        return
+    if block:
+        _init_rag()
+    else:
+        threading.Thread(target=_init_rag, name="rag-init", daemon=True).start()
+
+# Lambda: load the embedder + index during the init phase (boosted CPU, off the first request's
+# latency) instead of on the first /chat; _init_rag never raises, and /chat retries after a failure
+if IS_LAMBDA:
+    _start_warmup(block=True)
+
 if app:
+    @app.on_event("startup")
+    async def _warmup():
+        # dev server: warm up in the background so startup and /health stay instant;
+        # a plain import (tests, tooling) starts nothing
+        _start_warmup(block=False)
+
     @app.get("/health")
     async def _health():
-        global _rag_ready, _run_chat_fn, _rag_error
-        _init_rag()
+        # state only; loading happens in the startup hook above (or on the first /chat)
         resp = {"ok": True, "rag_ready": _rag_ready}
         if not _rag_ready and _rag_error:
             resp["error"] = f"RAG back-end not initialized: {_rag_error}"
@@ -680,8 +889,7 @@ if app:
 
     @app.post("/chat")
     async def _chat(request: Request):  # pyright: ignore[reportMissingImports]
-        global _rag_ready, _run_chat_fn, _rag_error
-        _init_rag()
+        await asyncio.to_thread(_init_rag)  # waits on a warm-up in progress without blocking the loop
         if not _rag_ready or _run_chat_fn is None:
             return JSONResponse(status_code=200, content={
                 "answer": f"(stub) RAG back-end not initialized: {_rag_error or 'unknown'}",
@@ -694,5 +902,6 @@ if app:
         user_msg  = payload.get("user_msg") or payload.get("text") or ""
         session_id= payload.get("session_id", "cloud")
         domain    = payload.get("domain")
-        out = _run_chat_fn(user_msg, session_id=session_id, domain=domain)
+        # off the event loop, so concurrent requests overlap (and their query embeddings coalesce)
+        out = await asyncio.to_thread(_run_chat_fn, user_msg, session_id=session_id, domain=domain)
         return JSONResponse(status_code=200, content=out)
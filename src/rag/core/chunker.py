@@ -2,11 +2,12 @@ from typing import List
 import re
 
 PARA_SPLIT = re.compile(r"\n\s*\n+")  # blank-line paragraph breaks
+WS_RUN = re.compile(r"\s+")
 
 def split_into_paras(text: str) -> List[str]:
     # split on blank lines first for coherence
     parts = PARA_SPLIT.split(text or "")
-    cleaned = [re.sub(r"\s+", " ", p).strip() for p in parts if p and p.strip()]
+    cleaned = [WS_RUN.sub(" ", p).strip() for p in parts if p and p.strip()]
     return cleaned if cleaned else [text.strip()]
 
 def chunk_text(text: str, size: int = 900, overlap: int = 60) -> List[str]:
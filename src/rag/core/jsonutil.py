@@ -0,0 +1,29 @@
+# src/rag/core/jsonutil.py
+"""
+JSON helpers shared by the API, adapters, ingest and Slack handlers.
+orjson when installed (bytes in/bytes out, UTF-8 unescaped); stdlib json with the same output shape otherwise.
+"""
+import json
+
+try:
+    # Optional: faster JSON; stdlib json is the fallback
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+if orjson is not None:
+    loads = orjson.loads
+    dumps = orjson.dumps
+
+    def json_line(obj) -> bytes:
+        """One JSONL record, newline included."""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    loads = json.loads
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def json_line(obj) -> bytes:
+        """One JSONL record, newline included."""
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
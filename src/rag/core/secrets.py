@@ -1,15 +1,22 @@
 # src/rag/core/secrets.py
+import os
+import time
 import boto3
 
-_sm = boto3.client("secretsmanager")
-_cache = {}
+_sm = None  # created on first use, not at import
+_cache = {}  # arn -> (value, expires_at)
+_TTL = int(os.getenv("SECRET_CACHE_TTL", "3600"))  # refresh hourly to pick up rotations
 
 def get_secret(arn: str) -> str:
+    global _sm
     if not arn:
         return ""
-    if arn in _cache:
-        return _cache[arn]
+    hit = _cache.get(arn)
+    if hit is not None and hit[1] > time.time():
+        return hit[0]
+    if _sm is None:
+        _sm = boto3.client("secretsmanager")
     resp = _sm.get_secret_value(SecretId=arn)
     val = resp.get("SecretString", "")
-    _cache[arn] = val
+    _cache[arn] = (val, time.time() + _TTL)
     return val
@@ -1,10 +1,12 @@
 # src/rag/ingest/pipeline.py
 from __future__ import annotations
 import numpy as np
-import os, json
+import os
 from pathlib import Path
 from typing import Iterable, List, Dict, Any
 
+from rag.core.jsonutil import json_line as _json_line
+
 # Optional: load .env for local runs
 try:
     from dotenv import load_dotenv
@@ -106,9 +108,11 @@ def _normalize_rows(mat: np.ndarray) -> np.ndarray:
     # L2 row-normalize; adds numerical safety
     if mat.dtype != np.float32:
         mat = mat.astype(np.float32, copy=False)
-    norms = np.linalg.norm(mat, axis=1, keepdims=True)
-    norms[norms == 0] = 1.0
-    return mat / norms
+    n2 = np.einsum("ij,ij->i", mat, mat)  # squared norms in one pass
+    n2[n2 == 0] = 1.0
+    # in place: the caller's matrix is a fresh vstack that is only written out afterwards
+    np.multiply(mat, (1.0 / np.sqrt(n2))[:, None], out=mat)
+    return mat
 
 
 def _write_artifacts(index_path: Path, meta_path: Path, vectors: np.ndarray, metas: List[Dict[str, Any]]):
@@ -124,7 +128,7 @@ def _write_artifacts(index_path: Path, meta_path: Path, vectors: np.ndarray, met
 
     vectors = _normalize_rows(vectors)
     np.save(index_path, vectors)
-    with meta_path.open("w", encoding="utf-8") as f:
+    def _records():
         for m in metas:
             # enforce required fields for runtime
             rec = {
@@ -133,7 +137,11 @@ def _write_artifacts(index_path: Path, meta_path: Path, vectors: np.ndarray, met
                 "source_path": m.get("source_path") or m.get("source") or "",
                 "page": m.get("page"),
             }
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            yield _json_line(rec)
+
+    # single buffered writelines pass of ready-encoded UTF-8 lines; avoids a write() call per chunk
+    with meta_path.open("wb", buffering=1 << 16) as f:
+        f.writelines(_records())
     print(f"[ingest] wrote vectors -> {index_path}  shape={vectors.shape}")
     print(f"[ingest] wrote meta    -> {meta_path}   lines={len(metas)}")
 
@@ -221,10 +229,11 @@ def ingest_dirs(
 
     try:
         batch = int(os.getenv("EMBED_BATCH", "64"))
+        embed = getattr(embedder, "embed_np", None) or embedder.embed  # ndarray path skips list-of-floats
         vec_batches: List[np.ndarray] = []
         for i in range(0, len(all_texts), batch):
             slc = all_texts[i : i + batch]
-            vecs = embedder.embed(slc)                  # -> List[List[float]] or np.ndarray
+            vecs = embed(slc)                           # -> List[List[float]] or np.ndarray
             vecs = np.asarray(vecs, dtype=np.float32)   # uses *module-level* np
             vec_batches.append(vecs)
             print(f"[embed] {i+len(slc)}/{len(all_texts)}")
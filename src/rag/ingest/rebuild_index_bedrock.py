@@ -31,6 +31,35 @@ def _pick_text(rec: dict, preferred: str) -> str | None:
             return val.strip()
     return None
 
+def _build_index(X: np.ndarray, kind: str = "flat"):
+    """
+    Inner-product index over L2-normalized rows (scores are cosine).
+      flat  - exact, O(N*D) per query
+      hnsw  - graph search, ~O(log N); no training
+      ivfpq - coarse lists + product quantization, ~O(sqrt N); needs enough rows to train
+    """
+    n, d = X.shape
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+    elif kind == "ivfpq":
+        nlist = max(1, int(np.sqrt(n)))
+        m = d // 4 if d % 4 == 0 else 1
+        while d % m:
+            m -= 1
+        if n < 39 * max(nlist, 256):  # faiss wants ~39 points per centroid (PQ uses 256 per subspace)
+            print(f"[ingest] {n} rows is too few to train IVF-PQ; using flat")
+            return _build_index(X, "flat")
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+        index.nprobe = 16
+    else:
+        index = faiss.IndexFlatIP(d)
+    index.add(X)
+    return index
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--bucket", required=True)
@@ -39,6 +68,8 @@ def main():
     ap.add_argument("--text_field", default="chunk_text", help="primary field to use for text")
     ap.add_argument("--batch", type=int, default=64)
     ap.add_argument("--region", default=os.environ.get("AWS_REGION", "us-east-1"))
+    ap.add_argument("--index_kind", choices=["flat", "hnsw", "ivfpq"], default="flat",
+                    help="flat = exact; hnsw / ivfpq = sublinear search for large corpora")
     args = ap.parse_args()
 
     # Load chunks
@@ -72,13 +103,12 @@ def main():
         vecs.append(np.array(v, dtype="float32"))
         print(f"[ingest] embedded {min(i+args.batch, len(texts))}/{len(texts)}")
     X = np.concatenate(vecs, axis=0)
-    # normalize for cosine similarity with IndexFlatIP
+    # normalize for cosine similarity with inner-product indexes
     faiss.normalize_L2(X)
 
     d = X.shape[1]
-    index = faiss.IndexFlatIP(d)
-    index.add(X)
-    print(f"[ingest] FAISS index built: dim={d}, ntotal={index.ntotal}")
+    index = _build_index(X, args.index_kind)
+    print(f"[ingest] FAISS index built: kind={args.index_kind} dim={d}, ntotal={index.ntotal}")
 
     # Write local artifacts
     faiss_path = "faiss.index"
@@ -0,0 +1,64 @@
+# tests/test_embeddings_bedrock.py
+import io, json
+import pytest
+from rag.adapters import embeddings_bedrock
+from rag.adapters.embeddings_bedrock import BedrockEmbedder
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    embeddings_bedrock._EMBED_CACHE.clear()
+    yield
+    embeddings_bedrock._EMBED_CACHE.clear()
+
+
+class _FakeRuntime:
+    def __init__(self):
+        self.calls = []
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        req = json.loads(body)
+        self.calls.append(req)
+        if "texts" in req:  # cohere batch
+            out = {"embeddings": [{"embedding": [float(len(t))]} for t in req["texts"]]}
+        else:               # titan single
+            out = {"embedding": [float(len(req["inputText"]))]}
+        return {"body": io.BytesIO(json.dumps(out).encode("utf-8"))}
+
+
+def _embedder(model_id):
+    emb = BedrockEmbedder(model_id=model_id, region="us-east-1")
+    emb.client = _FakeRuntime()
+    return emb
+
+
+def test_titan_concurrent_embed_keeps_input_order():
+    emb = _embedder("amazon.titan-embed-text-v2:0")
+    texts = ["a" * n for n in range(1, 21)]
+    assert emb.embed(texts) == [[float(n)] for n in range(1, 21)]
+    assert len(emb.client.calls) == 20
+
+
+def test_cohere_embed_splits_into_max_batches(monkeypatch):
+    monkeypatch.setattr(embeddings_bedrock, "COHERE_MAX_BATCH", 4)
+    emb = _embedder("cohere.embed-english-v3")
+    texts = ["a" * n for n in range(1, 11)]
+    assert emb.embed(texts) == [[float(n)] for n in range(1, 11)]
+    assert sorted(len(c["texts"]) for c in emb.client.calls) == [2, 4, 4]
+    assert all(c["input_type"] == "search_document" for c in emb.client.calls)
+
+
+def test_repeat_texts_are_served_from_cache():
+    emb = _embedder("amazon.titan-embed-text-v2:0")
+    assert emb.embed(["aa", "b", "aa"]) == [[2.0], [1.0], [2.0]]
+    assert len(emb.client.calls) == 2
+    assert emb.embed(["b", "ccc"]) == [[1.0], [3.0]]
+    assert [c["inputText"] for c in emb.client.calls[2:]] == ["ccc"]
+
+
+def test_embed_np_returns_float32_matrix():
+    emb = _embedder("amazon.titan-embed-text-v2:0")
+    X = emb.embed_np(["ab", "abcd"])
+    assert X.dtype.name == "float32" and X.shape == (2, 1)
+    assert X[:, 0].tolist() == [2.0, 4.0]
+    assert emb.embed_np([]).shape[0] == 0
@@ -0,0 +1,168 @@
+# tests/test_slack_events.py
+import hashlib, hmac, time
+from handlers import slack_events
+
+SECRET = "test-signing-secret"
+
+
+def _signed_headers(body: bytes, secret: str = SECRET, ts: int | None = None):
+    ts = str(ts if ts is not None else int(time.time()))
+    sig = "v0=" + hmac.new(secret.encode(), b"v0:" + ts.encode() + b":" + body, hashlib.sha256).hexdigest()
+    return {"x-slack-request-timestamp": ts, "x-slack-signature": sig}
+
+
+def test_verify_accepts_valid_and_rejects_tampered(monkeypatch):
+    monkeypatch.setattr(slack_events, "_get_secret_by_env", lambda arn_env: SECRET)
+    body = b'{"type":"event_callback","event":{"text":"caf\xc3\xa9"}}'
+    headers = _signed_headers(body)
+    assert slack_events._verify(headers, body) is True
+    assert slack_events._verify(headers, body + b" ") is False
+    assert slack_events._verify(_signed_headers(body, secret="other"), body) is False
+    assert slack_events._verify({**headers, "x-slack-signature": "v0=caf\u00e9"}, body) is False
+
+
+def test_verify_rejects_without_fetching_secret(monkeypatch):
+    def _boom(arn_env):
+        raise AssertionError("secret fetched for a request that should be rejected early")
+    monkeypatch.setattr(slack_events, "_get_secret_by_env", _boom)
+    body = b"{}"
+    assert slack_events._verify({}, body) is False
+    assert slack_events._verify(_signed_headers(body, ts=int(time.time()) - 3600), body) is False
+    assert slack_events._verify({"x-slack-request-timestamp": "nope", "x-slack-signature": "v0=00"}, body) is False
+
+
+def test_app_mention_is_dispatched_async(monkeypatch):
+    jobs = []
+    monkeypatch.setattr(slack_events, "_verify", lambda headers, body: True)
+    monkeypatch.setattr(slack_events, "_dispatch_async", lambda job: jobs.append(job))
+    monkeypatch.setattr(slack_events, "_call_rag_api", lambda q: (_ for _ in ()).throw(AssertionError("RAG called inline")))
+    body = '{"type":"event_callback","event_id":"Ev-async-1","event":{"type":"app_mention","text":"<@U1> what is RAG?","channel":"C1","ts":"1.2"}}'
+    out = slack_events.handler({"headers": {}, "body": body}, None)
+    assert out["statusCode"] == 200
+    assert jobs == [{"channel": "C1", "question": "what is RAG?", "thread_ts": "1.2"}]
+
+
+def test_url_verification_returns_challenge_without_signature():
+    body = '{"token":"t","challenge":"abc123","type":"url_verification"}'
+    out = slack_events.handler({"headers": {}, "body": body}, None)
+    assert out["statusCode"] == 200
+    assert out["body"] == "abc123"
+
+
+def test_mention_prefix_is_stripped_only_at_start(monkeypatch):
+    jobs = []
+    monkeypatch.setattr(slack_events, "_verify", lambda headers, body: True)
+    monkeypatch.setattr(slack_events, "_dispatch_async", lambda job: jobs.append(job))
+    for i, (text, want) in enumerate([("<@U1ABC> is a > b?", "is a > b?"), ("is a > b?", "is a > b?")]):
+        body = slack_events._json_dumps({"type": "event_callback", "event_id": f"Ev-mention-{i}",
+                                         "event": {"type": "app_mention", "text": text, "channel": "C1", "ts": "1.2"}})
+        slack_events.handler({"headers": {}, "body": body.decode()}, None)
+        assert jobs[-1]["question"] == want
+
+
+def test_secret_is_cached_after_first_fetch(monkeypatch):
+    calls = []
+    monkeypatch.setenv("TEST_SECRET_ARN", "arn:aws:secretsmanager:us-east-1:1:secret:x")
+    monkeypatch.setattr(slack_events, "_secret_from_extension",
+                        lambda arn: calls.append(arn) or {"SecretString": "s3cr3t"})
+    slack_events._CACHE.pop("TEST_SECRET_ARN", None)
+    assert slack_events._get_secret_by_env("TEST_SECRET_ARN") == "s3cr3t"
+    assert slack_events._get_secret_by_env("TEST_SECRET_ARN") == "s3cr3t"
+    assert calls == ["arn:aws:secretsmanager:us-east-1:1:secret:x"]
+
+
+def test_dedupe_table_conditional_put(monkeypatch):
+    class _Conflict(Exception):
+        response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+
+    class _FakeDdb:
+        def __init__(self):
+            self.ids = set()
+
+        def put_item(self, TableName, Item, ConditionExpression):
+            eid = Item["event_id"]["S"]
+            if eid in self.ids:
+                raise _Conflict()
+            self.ids.add(eid)
+
+    monkeypatch.setattr(slack_events, "SLACK_DEDUPE_TABLE", "seen")
+    monkeypatch.setattr(slack_events, "_ddb", _FakeDdb())
+    assert slack_events._claim_event("Ev-ddb-1") is True
+    assert slack_events._claim_event("Ev-ddb-1") is False
+    assert "Ev-ddb-1" not in slack_events._SEEN_EVENTS
+
+
+def test_retry_is_acked_before_any_body_work(monkeypatch):
+    def _boom(*a, **k):
+        raise AssertionError("retried body was processed")
+    monkeypatch.setattr(slack_events, "SLACK_DEDUPE_TABLE", "")
+    monkeypatch.setattr(slack_events, "_verify", _boom)
+    monkeypatch.setattr(slack_events, "_json_loads", _boom)
+    out = slack_events.handler({"headers": {"X-Slack-Retry-Num": "1"}, "body": '{"event_id":"Ev-retry"}'}, None)
+    assert out["statusCode"] == 200
+
+
+def test_retry_goes_through_dedupe_claim_when_table_is_set(monkeypatch):
+    claimed, jobs = set(), []
+    monkeypatch.setattr(slack_events, "SLACK_DEDUPE_TABLE", "seen")
+    monkeypatch.setattr(slack_events, "_verify", lambda headers, body: True)
+    monkeypatch.setattr(slack_events, "_claim_event", lambda eid: eid not in claimed and not claimed.add(eid))
+    monkeypatch.setattr(slack_events, "_dispatch_async", lambda job: jobs.append(job))
+    body = '{"type":"event_callback","event_id":"Ev-retry-2","event":{"type":"app_mention","text":"q","channel":"C1","ts":"1.2"}}'
+    retry = {"headers": {"X-Slack-Retry-Num": "1"}, "body": body}
+    assert slack_events.handler(retry, None)["statusCode"] == 200   # first attempt died: retry is answered
+    assert slack_events.handler(retry, None)["statusCode"] == 200   # a second retry is a duplicate
+    assert len(jobs) == 1
+
+
+def test_smart_compact_strips_code_and_promotes_headings():
+    s = "# Title\n\n```py\nx = 1\n```\nUse `foo` here\n# Extra H1\n## Sub\n\n- point  "
+    assert slack_events._smart_compact_with_subheads(s) == "*Title*\nUse foo here\n*Sub*\n- point"
+
+
+def test_timed_out_post_is_sent_once(monkeypatch):
+    import threading, pytest, requests
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    posts = []
+
+    class _Slow(BaseHTTPRequestHandler):
+        def do_POST(self):
+            posts.append(self.path)
+            time.sleep(0.5)  # past the client's read timeout
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Slow)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(slack_events, "_HTTP", None)
+    s = slack_events._http()
+    s.mount("http://", s.get_adapter("https://slack.com"))  # same retry policy over plain http
+    try:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            s.post(f"http://127.0.0.1:{srv.server_port}/chat.postMessage", data=b"{}", timeout=(1, 0.1))
+    finally:
+        srv.shutdown()
+    assert posts == ["/chat.postMessage"]
+
+
+def test_smart_compact_drops_fences_next_to_stray_backticks():
+    s = "Use the ` character to quote.\n```py\nx = 1\n```\nDone"
+    assert slack_events._smart_compact_with_subheads(s) == "Use the ` character to quote.\nDone"
+    s = "Run ``x`` first\n```\nsecret = 1\n```\nDone"
+    out = slack_events._smart_compact_with_subheads(s)
+    assert "secret" not in out and out.endswith("Done")
+
+
+def test_failed_dispatch_releases_claim_for_the_retry(monkeypatch):
+    def _fail(job):
+        raise RuntimeError("SLACK_WORKER_FUNCTION is not set")
+    monkeypatch.setattr(slack_events, "SLACK_DEDUPE_TABLE", "")
+    monkeypatch.setattr(slack_events, "_verify", lambda headers, body: True)
+    monkeypatch.setattr(slack_events, "_dispatch_async", _fail)
+    monkeypatch.setattr(slack_events, "_answer_in_thread", lambda **k: (_ for _ in ()).throw(AssertionError("answered inline")))
+    body = '{"type":"event_callback","event_id":"Ev-nodispatch","event":{"type":"app_mention","text":"q","channel":"C1","ts":"1.2"}}'
+    assert slack_events.handler({"headers": {}, "body": body}, None)["statusCode"] == 500
+    assert "Ev-nodispatch" not in slack_events._SEEN_EVENTS
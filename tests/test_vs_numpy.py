@@ -32,4 +32,245 @@ def test_search_cosine_top1():
 
     assert len(hits) == 2
     assert hits[0]["title"] in ("v1","v2")
-    assert hits[0]["score"] >= hits[1]["score"]
\ No newline at end of file
+    assert hits[0]["score"] >= hits[1]["score"]
+
+
+def _make_store(tmp_path, X, metas=None):
+    """Write X + meta.jsonl under tmp_path and load them; metas defaults to titles v0..vN-1 (a str is written raw)."""
+    vecp = str(tmp_path / "vectors.npy")
+    metap = str(tmp_path / "meta.jsonl")
+    np.save(vecp, X, allow_pickle=False)
+    if metas is None:
+        metas = [{"title": f"v{i}"} for i in range(len(X))]
+    with open(metap, "w") as f:
+        f.write(metas if isinstance(metas, str) else "".join(json.dumps(m) + "\n" for m in metas))
+    store = NumpyStore(vecp, metap)
+    store.ensure(bucket="", prefix="")
+    return store
+
+
+def test_search_returns_meta_fields_from_columns(tmp_path):
+    X = np.eye(3, dtype=np.float32)
+    metas = [
+        {"chunk_text": "alpha", "title": "A", "source_path": "a.pdf", "page": 1},
+        {"text": "beta", "title": "B", "source": "b.pdf"},
+        {},
+    ]
+    store = _make_store(tmp_path, X, metas)
+
+    hit = store.search([0, 1, 0], k=1)[0]
+    assert (hit["chunk_text"], hit["title"], hit["source_path"], hit["page"]) == ("beta", "B", "b.pdf", None)
+    assert hit["meta"]["title"] == "B"
+    assert store.search([0, 0, 1], k=1)[0]["chunk_text"] == ""
+
+
+def test_search_batch_matches_single_queries(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((20, 8)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+
+    Q = np.vstack([X[3], np.zeros(8, dtype=np.float32), X[11]])
+    batched = store.search_batch(Q, k=3)
+    assert batched[1] == []
+    assert [h["title"] for h in batched[0]] == [h["title"] for h in store.search(X[3], k=3)]
+    assert batched[2][0]["title"] == "v11"
+
+    # more queries than one GEMM block: split internally, order preserved
+    big = store.search_batch(X, k=1)
+    assert [hits[0]["title"] for hits in big] == [f"v{i}" for i in range(len(X))]
+
+
+def test_int8_quantized_store_keeps_ranking(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_QUANT", "int8")
+    rng = np.random.default_rng(1)
+    X = rng.standard_normal((50, 16)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+
+    assert store.vecs.dtype == np.int8
+    hit = store.search(X[7], k=1)[0]
+    assert hit["title"] == "v7"
+    assert abs(hit["score"] - 1.0) < 0.02
+
+    # approximate int8 scores only (no float32 re-score) still rank the exact match first
+    store._fp32 = None
+    assert store.search(X[7], k=1)[0]["title"] == "v7"
+
+
+def test_scores_match_numpy_fallback(tmp_path, monkeypatch):
+    from rag.adapters import vs_numpy
+    rng = np.random.default_rng(2)
+    X = rng.standard_normal((30, 12)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+
+    q = X[:2] / np.linalg.norm(X[:2], axis=1, keepdims=True)
+    fast = store._scores(q)
+    monkeypatch.setattr(vs_numpy, "_simsimd", None)
+    assert np.allclose(fast, store._scores(q), atol=1e-4)
+
+
+def test_normalized_index_is_served_from_mmap(tmp_path):
+    X = np.array([[0.6, 0.8], [1.0, 0.0], [0.0, 0.0]], dtype=np.float32)
+    store = _make_store(tmp_path, X)
+    assert isinstance(store.vecs, np.memmap)
+    assert store.search([0.6, 0.8], k=1)[0]["title"] == "v0"
+
+    np.save(store.index_path, X * 3, allow_pickle=False)   # not unit length -> copied + normalized
+    store.ensure(bucket="", prefix="")
+    assert not isinstance(store.vecs, np.memmap)
+    assert np.allclose(np.linalg.norm(store.vecs[:2], axis=1), 1.0)
+
+
+def test_repeated_titles_share_one_string(tmp_path):
+    X = np.eye(4, dtype=np.float32)
+    store = _make_store(tmp_path, X, [{"title": "Handbook", "source_path": "hb.pdf", "page": i} for i in range(4)])
+
+    assert all(t is store._titles[0] for t in store._titles)
+    assert all(s is store._sources[0] for s in store._sources)
+    assert store.search([0, 0, 1, 0], k=1)[0]["page"] == 2
+
+
+def test_fused_kernel_matches_argpartition():
+    from rag.adapters._simd_kernels import top_k_cosine
+    if top_k_cosine is None:
+        import pytest
+        pytest.skip("numba not installed")
+    rng = np.random.default_rng(4)
+    X = rng.standard_normal((9000, 16)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    q = X[123]
+    idx, scores = top_k_cosine(X, q, 5)
+    ref = np.argsort(-(X @ q))[:5]
+    assert idx.tolist() == ref.tolist()
+    assert np.allclose(scores, (X @ q)[ref], atol=1e-5)
+
+    # pruning by min_score keeps exactly the rows at or above it
+    sims = X @ q
+    ref = np.argsort(-sims)[:50]
+    ref = ref[sims[ref] >= 0.2]
+    idx, scores = top_k_cosine(X, q, 50, min_score=0.2)
+    assert idx.tolist() == ref.tolist()
+    assert (scores >= 0.2).all()
+
+
+def test_ensure_waits_on_matching_prefetch(tmp_path, monkeypatch):
+    calls = []
+    local = _make_store(tmp_path, np.eye(2, dtype=np.float32))
+    paths = (local.index_path, local.meta_path)
+    store = NumpyStore(*paths)
+    monkeypatch.setattr(store, "_download_s3", lambda b, p, t: calls.append((b, p)) or paths)
+    store.prefetch("bkt", "rag/index")
+    store.ensure(bucket="bkt", prefix="rag/index")
+    assert store.ready()
+    assert calls == [("bkt", "rag/index")]
+
+
+def test_hnsw_route_finds_exact_match(tmp_path, monkeypatch):
+    from rag.adapters import vs_numpy
+    if vs_numpy.hnswlib is None:
+        import pytest
+        pytest.skip("hnswlib not installed")
+    monkeypatch.setenv("VECTOR_ANN", "hnsw")
+    monkeypatch.setattr(vs_numpy, "_ANN_MIN_ROWS", 10)
+    rng = np.random.default_rng(5)
+    X = rng.standard_normal((200, 16)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+    assert store._ann is not None
+    assert os.path.isfile(store.index_path + ".hnsw")
+    hit = store.search(X[42], k=1)[0]
+    assert hit["title"] == "v42" and abs(hit["score"] - 1.0) < 1e-4
+
+    reloaded = NumpyStore(store.index_path, store.meta_path)   # picks up the saved graph
+    reloaded.ensure(bucket="", prefix="")
+    assert reloaded.search(X[7], k=1)[0]["title"] == "v7"
+
+
+def test_aligned_copy_is_64_byte_aligned():
+    from rag.adapters.vs_numpy import _aligned_copy
+    for shape in [(3, 5), (7, 384), (1, 1)]:
+        src = np.arange(np.prod(shape), dtype=np.float64).reshape(shape)
+        out = _aligned_copy(src)
+        assert out.ctypes.data % 64 == 0
+        assert out.dtype == np.float32 and out.flags.c_contiguous
+        assert np.array_equal(out, src.astype(np.float32))
+
+
+def test_search_normalized_flag_skips_query_norm(tmp_path):
+    rng = np.random.default_rng(3)
+    X = rng.standard_normal((10, 8)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+
+    q = X[4] / np.linalg.norm(X[4])
+    assert [h["title"] for h in store.search(q, k=3, normalized=True)] == \
+        [h["title"] for h in store.search(X[4] * 5.0, k=3)]
+    assert store.search(np.zeros(8, dtype=np.float32), k=3, normalized=True) == []
+
+
+def test_row_tiled_batch_matches_full_scores(tmp_path, monkeypatch):
+    import rag.adapters.vs_numpy as vs
+    monkeypatch.setattr(vs, "_FUSED_MIN_ROWS", 0)
+    monkeypatch.setattr(vs, "_ROW_TILE", 7)  # tiles that don't divide N, some smaller than k
+    rng = np.random.default_rng(5)
+    X = rng.standard_normal((50, 8)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    store = _make_store(tmp_path, X)
+
+    Q = np.vstack([X[2], X[40], np.zeros(8, dtype=np.float32)])
+    res = store.search_batch(Q, k=10)
+    for b in range(2):
+        ref = np.argsort(-(X @ Q[b]))[:10]
+        assert [h["title"] for h in res[b]] == [f"v{i}" for i in ref]
+    assert res[2] == []
+
+
+def test_ivfpq_route_reranks_to_exact_match(tmp_path, monkeypatch):
+    from rag.adapters import vs_numpy
+    if vs_numpy.faiss is None:
+        import pytest
+        pytest.skip("faiss not installed")
+    monkeypatch.setenv("VECTOR_ANN", "ivfpq")
+    monkeypatch.setattr(vs_numpy, "_ANN_MIN_ROWS", 10)
+    rng = np.random.default_rng(6)
+    X = rng.standard_normal((1000, 16)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+    assert isinstance(store._ann, vs_numpy._IVFPQ)
+    assert os.path.isfile(store.index_path + ".ivfpq")
+    hit = store.search(X[42], k=1)[0]
+    assert hit["title"] == "v42" and abs(hit["score"] - 1.0) < 1e-4
+
+    reloaded = NumpyStore(store.index_path, store.meta_path)   # picks up the saved index
+    reloaded.ensure(bucket="", prefix="")
+    assert reloaded.search(X[7], k=1)[0]["title"] == "v7"
+
+
+def test_fp16_store_matches_float32_ranking(tmp_path, monkeypatch):
+    from rag.adapters import vs_numpy
+    monkeypatch.setenv("VECTOR_QUANT", "fp16")
+    rng = np.random.default_rng(7)
+    X = rng.standard_normal((60, 16)).astype(np.float32)
+    store = _make_store(tmp_path, X)
+
+    assert store.vecs.dtype == np.float16
+    Xn = X / np.linalg.norm(X, axis=1, keepdims=True)
+    ref = [f"v{i}" for i in np.argsort(-(Xn @ Xn[9]))[:5]]
+    assert [h["title"] for h in store.search(X[9], k=5)] == ref   # float32 re-score
+    hit = store.search(X[9], k=1)[0]
+    assert abs(hit["score"] - 1.0) < 1e-4
+
+    # fp16 scores alone (SimSIMD or the widening fallback) agree to fp16 precision
+    store._fp32 = None
+    Q = Xn[9:10]
+    approx = store._scores(Q)
+    monkeypatch.setattr(vs_numpy, "_simsimd", None)
+    assert np.allclose(approx, store._scores(Q), atol=2e-3)
+    assert np.allclose(approx, Q @ Xn.T, atol=2e-3)
+
+
+def test_meta_mmap_texts_match_heap_texts(tmp_path, monkeypatch):
+    import rag.adapters.vs_numpy as vs
+    monkeypatch.setattr(vs, "_META_MMAP", True)
+    X = np.eye(3, dtype=np.float32)
+    raw = (json.dumps({"chunk_text": "café", "title": "A"}) + "\n\n"
+           + json.dumps({"text": "gamma", "title": "C"}))  # blank middle line, no trailing newline
+    store = _make_store(tmp_path, X, raw)
+    assert isinstance(store._texts, vs._MmapTexts)
+    assert [store.search(X[i], k=1)[0]["chunk_text"] for i in range(3)] == ["café", "", "gamma"]